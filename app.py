@@ -2,21 +2,71 @@ from flask import Flask, render_template, request, redirect, url_for, session, j
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-from emotion_detection import detect_emotion_and_respond
+from datetime import datetime, timedelta, timezone
+from emotion_detection import detect_emotion_and_respond, detect_emotions_batch, start_lexicon_watcher, train_classifier, ENGINES, DEFAULT_ENGINE, current_lexicon, search_tips, get_age_group, AGE_GROUPS, \
+    rank_tips, set_tip_popularity, adjust_tip_popularity, TIP_RANKINGS, stress_level_for, turn_emotion, is_follow_up
+from detection_executor import DetectionExecutor, DetectorBusy, DetectorTimeout
+from conversation_context import ConversationContext, Turn
+from shadow_mode import ShadowEvaluator
+from functools import partial
+from stress_trend import update_trend
+from background_worker import BackgroundBatchWorker, PeriodicTask
+from database import configure_sqlite, sqlite_pragmas, measure_reader_waits, run_maintenance, enable_incremental_vacuum, CHECKPOINT_MODES
+from config import Config
 import os
 import logging
 import json
+import time
+import hashlib
+import click
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.config.from_object(Config)
 
 # Secret key for sessions
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'fallback-secret-key-change-this')
 
+# -------------------------------------------------------------------
+# Emotion Detection Execution
+# -------------------------------------------------------------------
+
+# inline runs detection in the request thread; thread/process use a bounded pool
+app.config['DETECTION_MODE'] = os.environ.get('DETECTION_MODE', 'inline')
+app.config['DETECTION_WORKERS'] = int(os.environ.get('DETECTION_WORKERS', 2))
+app.config['DETECTION_QUEUE_SIZE'] = int(os.environ.get('DETECTION_QUEUE_SIZE', 8))
+app.config['DETECTION_TIMEOUT'] = float(os.environ.get('DETECTION_TIMEOUT', 5))
+app.config['MAX_MESSAGE_LENGTH'] = int(os.environ.get('MAX_MESSAGE_LENGTH', 5000))
+
+detector = DetectionExecutor(
+    mode=app.config['DETECTION_MODE'],
+    workers=app.config['DETECTION_WORKERS'],
+    queue_size=app.config['DETECTION_QUEUE_SIZE'],
+    timeout=app.config['DETECTION_TIMEOUT'],
+    initializer=start_lexicon_watcher  # worker processes watch the lexicon files too
+)
+
+# Reload keyword and response files when they change, without a restart
+start_lexicon_watcher()
+
+# -------------------------------------------------------------------
+# Conversation Context (recent turns per user, kept in memory)
+# -------------------------------------------------------------------
+
+app.config['CONTEXT_TURNS'] = int(os.environ.get('CONTEXT_TURNS', 5))
+app.config['CONTEXT_MAX_USERS'] = int(os.environ.get('CONTEXT_MAX_USERS', 10000))
+app.config['CONTEXT_MAX_BYTES'] = int(os.environ.get('CONTEXT_MAX_BYTES', 8 * 1024 * 1024))
+
+# Per process: each gunicorn worker remembers the users it has served
+conversation_context = ConversationContext(
+    max_users=app.config['CONTEXT_MAX_USERS'],
+    turns=app.config['CONTEXT_TURNS'],
+    max_bytes=app.config['CONTEXT_MAX_BYTES']
+)
+
 # -------------------------------------------------------------------
 # Database Configuration
 # -------------------------------------------------------------------
@@ -39,6 +89,10 @@ logger.info(f"🗄️ Database will be stored at: {db_path}")
 
 db = SQLAlchemy(app)
 
+# WAL, busy_timeout, synchronous, cache and mmap size on every new connection (SQLITE_* in config.Config)
+with app.app_context():
+    configure_sqlite(db.engine, app.config)
+
 # Setup Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -69,6 +123,8 @@ class Conversation(db.Model):
     bot_response = db.Column(db.Text, nullable=False)
     detected_emotion = db.Column(db.String(100))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    stress_score = db.Column(db.Float)
+    __table_args__ = (db.Index('ix_conversation_user_timestamp', 'user_id', 'timestamp'),)
 
 class Journal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -77,6 +133,11 @@ class Journal(db.Model):
     content = db.Column(db.Text, nullable=False)
     mood = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Filled in by the background journal tagger, next to the mood the user picked
+    detected_emotion = db.Column(db.String(100))
+    stress_score = db.Column(db.Float)
+    tagged_at = db.Column(db.DateTime)
+    __table_args__ = (db.Index('ix_journal_user_created', 'user_id', 'created_at'),)
 
 class FavoriteTip(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -85,6 +146,473 @@ class FavoriteTip(db.Model):
     emotion = db.Column(db.String(100))
     saved_from = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    age_group = db.Column(db.String(20))  # saver's age group, for tip popularity
+    tip_hash = db.Column(db.String(64), nullable=False)  # see hash_tip; one row per user and tip
+    __table_args__ = (
+        db.Index('ix_favorite_tip_user_created', 'user_id', 'created_at'),
+        db.Index('ux_favorite_tip_user_hash', 'user_id', 'tip_hash', unique=True),
+    )
+
+def hash_tip(tip_text):
+    """Fixed-size key for a tip's text, so uniqueness doesn't index the whole Text column"""
+    return hashlib.sha256(tip_text.encode('utf-8')).hexdigest()
+
+# How many users saved each tip, per emotion and age group; kept up to date on save/delete
+class TipPopularity(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    emotion = db.Column(db.String(100), nullable=False)
+    age_group = db.Column(db.String(20), nullable=False)
+    tip_text = db.Column(db.Text, nullable=False)
+    saves = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('emotion', 'age_group', 'tip_text'),)
+
+# Candidate engine results recorded by shadow mode, one row per sampled request
+class ShadowComparison(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    primary_engine = db.Column(db.String(50), nullable=False)
+    candidate_engine = db.Column(db.String(50), nullable=False)
+    primary_emotion = db.Column(db.String(100))
+    candidate_emotion = db.Column(db.String(100))
+    primary_stress = db.Column(db.Float)
+    candidate_stress = db.Column(db.Float)
+    agreed = db.Column(db.Boolean, nullable=False)
+    primary_latency_ms = db.Column(db.Float)
+    candidate_latency_ms = db.Column(db.Float)
+    message = db.Column(db.Text)  # kept only when the engines disagree
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Running stress state per user, updated with every detected message
+class StressTrend(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    ewma = db.Column(db.Float, nullable=False, default=0.0)  # exponentially weighted average stress
+    variance = db.Column(db.Float, nullable=False, default=0.0)
+    cusum_up = db.Column(db.Float, nullable=False, default=0.0)
+    cusum_down = db.Column(db.Float, nullable=False, default=0.0)
+    direction = db.Column(db.String(20))  # 'rising' or 'falling' since changed_at
+    changed_at = db.Column(db.DateTime)
+    last_score = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Conversation totals per user, updated in the same transaction as each new conversation
+class UserStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    conversations = db.Column(db.Integer, nullable=False, default=0)
+    emotion_counts = db.Column(db.JSON, nullable=False, default=dict)  # {emotion: conversations}
+    stress_sum = db.Column(db.Float, nullable=False, default=0.0)
+    stress_count = db.Column(db.Integer, nullable=False, default=0)  # conversations with a stress score
+    last_active_at = db.Column(db.DateTime)
+
+# Conversations per user per day and per week, maintained as they are saved, for the mood chart
+class MoodRollup(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    period = db.Column(db.String(10), primary_key=True)  # 'day' or 'week'
+    start = db.Column(db.DateTime, primary_key=True)  # midnight UTC; weeks start on Monday
+    conversations = db.Column(db.Integer, nullable=False, default=0)
+    mood_sum = db.Column(db.Float, nullable=False, default=0.0)  # MOOD_SCORES of each conversation
+    stress_sum = db.Column(db.Float, nullable=False, default=0.0)
+    stress_count = db.Column(db.Integer, nullable=False, default=0)
+    emotion_counts = db.Column(db.JSON, nullable=False, default=dict)
+
+# Progress of resumable background jobs, one row per job name
+class JobCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    version = db.Column(db.String(100))  # what the job's results depend on, e.g. lexicon version
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    changed = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+def record_stress(user_id, stress_scores, now=None):
+    """Fold new stress scores into the user's trend; the caller commits"""
+    trend = db.session.get(StressTrend, user_id)
+    if trend is None:
+        trend = StressTrend(user_id=user_id, count=0)
+        db.session.add(trend)
+    for score in stress_scores:
+        update_trend(trend, score, now or datetime.utcnow())
+    return trend
+
+def record_user_stats(user_id, conversations):
+    """Count flushed ``conversations`` into the user's stats row; the caller commits.
+
+    Flush the conversations first: the insert takes SQLite's write lock, so
+    the stats row read here can't be changed by another request before commit.
+    """
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats(user_id=user_id, conversations=0, emotion_counts={},
+                          stress_sum=0.0, stress_count=0)
+        db.session.add(stats)
+    emotion_counts = dict(stats.emotion_counts or {})
+    for conversation in conversations:
+        emotion = conversation.detected_emotion or 'Unknown'
+        emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+        stats.conversations += 1
+        if conversation.stress_score is not None:
+            stats.stress_sum += conversation.stress_score
+            stats.stress_count += 1
+        if stats.last_active_at is None or conversation.timestamp > stats.last_active_at:
+            stats.last_active_at = conversation.timestamp
+    stats.emotion_counts = emotion_counts  # reassigned so the JSON change is saved
+    return stats
+
+# Scores the profile used before each conversation stored its own; only for backfilling old rows
+LEGACY_STRESS_SCORES = {
+    'Exam Stress': 7,
+    'Work Pressure': 7,
+    'Anxiety': 8,
+    'Anger/Frustration': 6,
+    'Burnout/Exhaustion': 8,
+    'Sadness': 5,
+    'Relationship Concern': 6,
+    'Gentle Conversation': 2,
+    'Happiness': 1
+}
+
+def rebuild_user_stats(user_ids):
+    """Recompute stats rows for ``user_ids`` from their conversations; the caller commits"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    # Conversations saved before stress_score existed get the score the profile used to assume
+    db.session.execute(
+        db.update(Conversation)
+          .where(Conversation.user_id.in_(user_ids), Conversation.stress_score.is_(None))
+          .values(stress_score=db.case(LEGACY_STRESS_SCORES, value=Conversation.detected_emotion, else_=3))
+    )
+    rows = db.session.query(Conversation.user_id, Conversation.detected_emotion,
+                            db.func.count(Conversation.id), db.func.sum(Conversation.stress_score),
+                            db.func.count(Conversation.stress_score), db.func.max(Conversation.timestamp))\
+             .filter(Conversation.user_id.in_(user_ids))\
+             .group_by(Conversation.user_id, Conversation.detected_emotion).all()
+    stats = {user_id: UserStats(user_id=user_id, conversations=0, emotion_counts={},
+                                stress_sum=0.0, stress_count=0) for user_id in user_ids}
+    for user_id, emotion, count, stress_sum, stress_count, last_active_at in rows:
+        user_stats = stats[user_id]
+        user_stats.emotion_counts[emotion or 'Unknown'] = count
+        user_stats.conversations += count
+        user_stats.stress_sum += stress_sum or 0.0
+        user_stats.stress_count += stress_count
+        if user_stats.last_active_at is None or last_active_at > user_stats.last_active_at:
+            user_stats.last_active_at = last_active_at
+    for user_stats in stats.values():
+        db.session.merge(user_stats)
+
+def seed_user_stats():
+    """One-off per user: build stats rows for users who had conversations before stats were kept"""
+    missing = [user_id for user_id, in db.session.query(Conversation.user_id.distinct())
+               .outerjoin(UserStats, UserStats.user_id == Conversation.user_id)
+               .filter(UserStats.user_id.is_(None)).all()]
+    for start in range(0, len(missing), 500):
+        rebuild_user_stats(missing[start:start + 500])
+        db.session.commit()
+    if missing:
+        logger.info(f"📊 Built conversation stats for {len(missing)} users")
+
+# -------------------------------------------------------------------
+# Mood Rollups (daily and weekly totals behind /api/mood)
+# -------------------------------------------------------------------
+
+MOOD_PERIODS = ('day', 'week')
+
+# Where each emotion sits on the mood chart's axis
+MOOD_SCORES = {
+    'Exam Stress': 1,
+    'Work Pressure': 2,
+    'Sadness': 3,
+    'Anxiety': 4,
+    'Anger/Frustration': 5,
+    'Burnout/Exhaustion': 6,
+    'Relationship Concern': 7,
+    'Gentle Conversation': 8,
+    'Happiness': 9
+}
+DEFAULT_MOOD_SCORE = 5
+
+def period_start(timestamp, period):
+    """Midnight starting ``timestamp``'s day, or the Monday starting its week"""
+    day = datetime(timestamp.year, timestamp.month, timestamp.day)
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+def adjust_mood_rollups(user_id, changes):
+    """Fold ``(timestamp, emotion, stress_score, sign)`` changes into the user's rollups; the caller commits.
+
+    ``sign`` is 1 for a new conversation and -1 to take one back out, e.g. when it is relabeled.
+    """
+    rollups = {}
+    for timestamp, emotion, stress_score, sign in changes:
+        emotion = emotion or 'Unknown'
+        for period in MOOD_PERIODS:
+            key = (period, period_start(timestamp, period))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = db.session.get(MoodRollup, (user_id, *key))
+                if rollup is None:
+                    rollup = MoodRollup(user_id=user_id, period=period, start=key[1], conversations=0,
+                                        mood_sum=0.0, stress_sum=0.0, stress_count=0, emotion_counts={})
+                    db.session.add(rollup)
+                rollups[key] = rollup
+            rollup.conversations += sign
+            rollup.mood_sum += sign * MOOD_SCORES.get(emotion, DEFAULT_MOOD_SCORE)
+            if stress_score is not None:
+                rollup.stress_sum += sign * stress_score
+                rollup.stress_count += sign
+            # Always a new dict: lookups above may autoflush, and in-place JSON changes aren't saved
+            emotion_counts = dict(rollup.emotion_counts or {})
+            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + sign
+            if emotion_counts[emotion] <= 0:
+                del emotion_counts[emotion]
+            rollup.emotion_counts = emotion_counts
+
+def record_mood_rollups(user_id, conversations):
+    """Count flushed ``conversations`` into the user's day and week rollups; the caller commits"""
+    adjust_mood_rollups(user_id, [(conversation.timestamp, conversation.detected_emotion,
+                                   conversation.stress_score, 1) for conversation in conversations])
+
+def rebuild_mood_rollups(user_ids):
+    """Recompute every rollup for ``user_ids`` from their conversations; the caller commits"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    MoodRollup.query.filter(MoodRollup.user_id.in_(user_ids)).delete(synchronize_session=False)
+    day = db.func.date(Conversation.timestamp)
+    rows = db.session.query(Conversation.user_id, day, Conversation.detected_emotion,
+                            db.func.count(Conversation.id), db.func.sum(Conversation.stress_score),
+                            db.func.count(Conversation.stress_score))\
+             .filter(Conversation.user_id.in_(user_ids), Conversation.timestamp.isnot(None))\
+             .group_by(Conversation.user_id, day, Conversation.detected_emotion).all()
+    rollups = {}
+    for user_id, date, emotion, count, stress_sum, stress_count in rows:
+        emotion = emotion or 'Unknown'
+        for period in MOOD_PERIODS:
+            start = period_start(datetime.strptime(date, '%Y-%m-%d'), period)
+            rollup = rollups.get((user_id, period, start))
+            if rollup is None:
+                rollup = rollups[(user_id, period, start)] = MoodRollup(
+                    user_id=user_id, period=period, start=start, conversations=0,
+                    mood_sum=0.0, stress_sum=0.0, stress_count=0, emotion_counts={})
+            rollup.conversations += count
+            rollup.mood_sum += count * MOOD_SCORES.get(emotion, DEFAULT_MOOD_SCORE)
+            rollup.stress_sum += stress_sum or 0.0
+            rollup.stress_count += stress_count
+            rollup.emotion_counts[emotion] = rollup.emotion_counts.get(emotion, 0) + count
+    db.session.add_all(rollups.values())
+
+def seed_mood_rollups():
+    """One-off per user: build rollups for users who had conversations before rollups were kept"""
+    missing = [user_id for user_id, in db.session.query(Conversation.user_id.distinct())
+               .filter(~db.exists().where(MoodRollup.user_id == Conversation.user_id)).all()]
+    for start in range(0, len(missing), 100):
+        rebuild_mood_rollups(missing[start:start + 100])
+        db.session.commit()
+    if missing:
+        logger.info(f"📈 Built mood rollups for {len(missing)} users")
+
+# -------------------------------------------------------------------
+# Journal Tagging (detect emotions in journal entries, off the request path)
+# -------------------------------------------------------------------
+
+# 'background' tags new and untagged entries on a worker thread; 'off' leaves it to `flask tag-journals`
+app.config['JOURNAL_TAGGING'] = os.environ.get('JOURNAL_TAGGING', 'background')
+app.config['JOURNAL_TAG_BATCH'] = int(os.environ.get('JOURNAL_TAG_BATCH', 50))
+app.config['JOURNAL_TAG_INTERVAL'] = float(os.environ.get('JOURNAL_TAG_INTERVAL', 30))
+# Only the start of very long entries is analyzed
+JOURNAL_TAG_MAX_CHARS = 20000
+
+def tag_journals(entries):
+    """Detect emotions for ``(id, title, content)`` rows and store them; the caller commits"""
+    texts = [f"{title}. {content}"[:JOURNAL_TAG_MAX_CHARS] for _, title, content in entries]
+    now = datetime.utcnow()
+    results = detect_emotions_batch(texts)
+    db.session.execute(db.update(Journal), [
+        {'id': entry[0], 'detected_emotion': result.emotion,
+         'stress_score': result.stress_score, 'tagged_at': now}
+        for entry, result in zip(entries, results)
+    ])
+
+def tag_untagged_journals(limit=None):
+    """Tag the oldest untagged journal entries; returns how many were tagged"""
+    with app.app_context():
+        entries = db.session.query(Journal.id, Journal.title, Journal.content)\
+                    .filter(Journal.tagged_at.is_(None))\
+                    .order_by(Journal.id).limit(limit or app.config['JOURNAL_TAG_BATCH']).all()
+        if not entries:
+            return 0
+        try:
+            tag_journals(entries)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(entries)
+
+journal_tagger = BackgroundBatchWorker(
+    tag_untagged_journals,
+    interval=app.config['JOURNAL_TAG_INTERVAL'],
+    name='journal-tagger'
+)
+
+# -------------------------------------------------------------------
+# Tip Popularity (rank tips by how often they are saved)
+# -------------------------------------------------------------------
+
+# '' keeps the pool's order; 'popular' puts the most saved tips first; 'weighted' shuffles by saves
+app.config['TIP_RANKING'] = os.environ.get('TIP_RANKING', '')
+# Other workers' saves reach this process's counts on the next refresh
+app.config['TIP_POPULARITY_REFRESH'] = float(os.environ.get('TIP_POPULARITY_REFRESH', 60))
+
+if app.config['TIP_RANKING'] and app.config['TIP_RANKING'] not in TIP_RANKINGS:
+    logger.warning(f"⚠️ Unknown tip ranking {app.config['TIP_RANKING']!r}, tips keep their pool order")
+    app.config['TIP_RANKING'] = ''
+
+def bump_tip_popularity(emotion, age_group, tip_text, delta):
+    """Add ``delta`` to a tip's save count in the current transaction; the caller commits"""
+    from sqlalchemy.dialects.sqlite import insert
+    statement = insert(TipPopularity).values(emotion=emotion, age_group=age_group,
+                                             tip_text=tip_text, saves=max(delta, 0))
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['emotion', 'age_group', 'tip_text'],
+        set_={'saves': db.func.max(TipPopularity.saves + delta, 0)}
+    ))
+
+def load_tip_popularity():
+    """Load every save count into memory"""
+    with app.app_context():
+        rows = db.session.query(TipPopularity.emotion, TipPopularity.age_group,
+                                TipPopularity.tip_text, TipPopularity.saves).all()
+        set_tip_popularity({(emotion, age_group, tip): saves for emotion, age_group, tip, saves in rows})
+
+def seed_tip_popularity():
+    """One-off: count favorites saved before popularity was tracked"""
+    if db.session.query(TipPopularity.id).first() is not None:
+        return
+    untagged = db.session.query(FavoriteTip.id, User.age).join(User, FavoriteTip.user_id == User.id)\
+                 .filter(FavoriteTip.age_group.is_(None)).all()
+    if untagged:
+        db.session.execute(db.update(FavoriteTip), [
+            {'id': favorite_id, 'age_group': get_age_group(age)} for favorite_id, age in untagged
+        ])
+    counts = db.session.query(FavoriteTip.emotion, FavoriteTip.age_group, FavoriteTip.tip_text,
+                              db.func.count(FavoriteTip.id))\
+               .group_by(FavoriteTip.emotion, FavoriteTip.age_group, FavoriteTip.tip_text).all()
+    db.session.add_all(TipPopularity(emotion=emotion or 'General', age_group=age_group,
+                                     tip_text=tip_text, saves=saves)
+                       for emotion, age_group, tip_text, saves in counts)
+    db.session.commit()
+    if counts:
+        logger.info(f"⭐ Seeded popularity for {len(counts)} saved tips")
+
+tip_popularity_refresher = PeriodicTask(
+    load_tip_popularity,
+    interval=app.config['TIP_POPULARITY_REFRESH'],
+    name='tip-popularity'
+)
+
+# -------------------------------------------------------------------
+# Shadow Mode (compare a candidate engine on live traffic)
+# -------------------------------------------------------------------
+
+# e.g. SHADOW_ENGINE=scored SHADOW_RATE=0.05 runs 5% of chats through 'scored' too
+app.config['SHADOW_ENGINE'] = os.environ.get('SHADOW_ENGINE', '')
+app.config['SHADOW_RATE'] = float(os.environ.get('SHADOW_RATE', 0))
+
+if app.config['SHADOW_ENGINE'] and app.config['SHADOW_ENGINE'] not in ENGINES:
+    logger.warning(f"⚠️ Unknown shadow engine {app.config['SHADOW_ENGINE']!r}, shadow mode disabled")
+    app.config['SHADOW_RATE'] = 0
+
+def save_shadow_comparisons(records):
+    """Write a batch of shadow comparisons from the shadow worker thread"""
+    with app.app_context():
+        try:
+            db.session.add_all(ShadowComparison(
+                primary_engine=DEFAULT_ENGINE,
+                candidate_engine=app.config['SHADOW_ENGINE'],
+                primary_emotion=record['primary_emotion'],
+                candidate_emotion=record['candidate_emotion'],
+                primary_stress=record['primary_stress'],
+                candidate_stress=record['candidate_stress'],
+                agreed=record['agreed'],
+                primary_latency_ms=record['primary_latency_ms'],
+                candidate_latency_ms=record['candidate_latency_ms'],
+                message=None if record['agreed'] else record['message']
+            ) for record in records)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    disagreements = sum(not record['agreed'] for record in records)
+    logger.info(f"🔍 Shadow {app.config['SHADOW_ENGINE']}: {len(records)} compared, {disagreements} disagreed")
+
+shadow = ShadowEvaluator(
+    candidate=partial(detect_emotion_and_respond, engine=app.config['SHADOW_ENGINE'] or None),
+    record=save_shadow_comparisons,
+    rate=app.config['SHADOW_RATE'] if app.config['SHADOW_ENGINE'] else 0
+)
+
+# -------------------------------------------------------------------
+# Database Maintenance (ANALYZE, incremental vacuum, WAL checkpoint)
+# -------------------------------------------------------------------
+
+# 'background' runs maintenance in-process when the app is quiet; 'off' leaves it to `flask maintain-db`
+app.config['DB_MAINTENANCE'] = os.environ.get('DB_MAINTENANCE', 'background')
+app.config['DB_MAINTENANCE_EVERY'] = float(os.environ.get('DB_MAINTENANCE_EVERY', 6 * 3600))
+# Only run after this many seconds without a request
+app.config['DB_MAINTENANCE_IDLE'] = float(os.environ.get('DB_MAINTENANCE_IDLE', 60))
+# Seconds of incremental vacuum per run; the rest is picked up by the next run
+app.config['DB_MAINTENANCE_BUDGET'] = float(os.environ.get('DB_MAINTENANCE_BUDGET', 0.5))
+app.config['DB_MAINTENANCE_VACUUM_PAGES'] = int(os.environ.get('DB_MAINTENANCE_VACUUM_PAGES', 256))
+
+last_request_at = time.monotonic()
+last_maintenance_at = None
+
+@app.before_request
+def note_traffic():
+    global last_request_at
+    last_request_at = time.monotonic()
+
+def maintain_database(budget=None, checkpoint='PASSIVE'):
+    """Run one time-bounded maintenance pass on a pooled connection and log its report"""
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        try:
+            report = run_maintenance(
+                connection.driver_connection,
+                budget=app.config['DB_MAINTENANCE_BUDGET'] if budget is None else budget,
+                vacuum_step=app.config['DB_MAINTENANCE_VACUUM_PAGES'],
+                checkpoint=checkpoint
+            )
+        finally:
+            connection.close()
+    before, after = report['before'], report['after']
+    logger.info(f"🧹 Database maintenance in {report['duration_ms']}ms: "
+                f"{before['file_bytes']} -> {after['file_bytes']} bytes, "
+                f"{before['freelist_count']} -> {after['freelist_count']} free pages, "
+                f"{report['vacuumed_pages']} vacuumed")
+    return report
+
+def maintain_database_when_idle():
+    """Run maintenance if it is due and no request came in lately"""
+    global last_maintenance_at
+    now = time.monotonic()
+    if last_maintenance_at is not None and now - last_maintenance_at < app.config['DB_MAINTENANCE_EVERY']:
+        return
+    if now - last_request_at < app.config['DB_MAINTENANCE_IDLE']:
+        return
+    last_maintenance_at = now
+    maintain_database()
+
+# Polls often enough to catch a quiet minute; each process keeps its own schedule
+database_maintainer = PeriodicTask(
+    maintain_database_when_idle,
+    interval=min(app.config['DB_MAINTENANCE_EVERY'], app.config['DB_MAINTENANCE_IDLE']),
+    name='db-maintenance'
+)
 
 # -------------------------------------------------------------------
 # User Loader for Flask-Login
@@ -100,18 +628,14 @@ def load_user(user_id):
 
 @app.context_processor
 def utility_processor():
-    def get_most_common_emotion(conversations):
-        if not conversations:
+    def get_most_common_emotion(stats=None):
+        # Reads the user's stats row rather than walking their conversations
+        if stats is None and current_user.is_authenticated:
+            stats = db.session.get(UserStats, current_user.id)
+        if stats is None or not stats.emotion_counts:
             return "N/A"
         
-        emotion_counts = {}
-        for conv in conversations:
-            emotion = conv.detected_emotion
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-        
-        if emotion_counts:
-            return max(emotion_counts, key=emotion_counts.get)
-        return "N/A"
+        return max(stats.emotion_counts, key=stats.emotion_counts.get)
     
     return dict(get_most_common_emotion=get_most_common_emotion)
 
@@ -234,52 +758,34 @@ def dashboard():
 @login_required
 def profile():
     try:
-        conversations = Conversation.query.filter_by(user_id=current_user.id).all()
-        
-        total_conversations = len(conversations)
-        
-        emotion_counts = {}
-        for conv in conversations:
-            emotion = conv.detected_emotion
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+        # Totals come from one stats row, however long the history is
+        stats = db.session.get(UserStats, current_user.id)
         
+        total_conversations = stats.conversations if stats else 0
+        emotion_counts = dict(stats.emotion_counts) if stats else {}
         unique_emotions = len(emotion_counts)
         
-        if conversations:
-            last_conv = max(conversations, key=lambda x: x.timestamp)
-            last_active = last_conv.timestamp.strftime('%b %d, %Y')
+        if stats and stats.last_active_at:
+            last_active = stats.last_active_at.strftime('%b %d, %Y')
         else:
             last_active = 'Never'
         
-        # Calculate average stress score
+        # Average stress score
         avg_stress = 0
-        stress_icon = "🟢"
-        
-        if conversations:
-            stress_map = {
-                'Exam Stress': 7,
-                'Work Pressure': 7,
-                'Anxiety': 8,
-                'Anger/Frustration': 6,
-                'Burnout/Exhaustion': 8,
-                'Sadness': 5,
-                'Relationship Concern': 6,
-                'Gentle Conversation': 2,
-                'Happiness': 1
+        if stats and stats.stress_count:
+            avg_stress = round(stats.stress_sum / stats.stress_count, 1)
+        stress_icon = stress_level_for(avg_stress)[1]
+
+        # Recent trend comes from one precomputed row, flagged changes show for a week
+        trend = db.session.get(StressTrend, current_user.id)
+        stress_trend = None
+        if trend is not None and trend.count:
+            recent_change = trend.changed_at is not None and \
+                            datetime.utcnow() - trend.changed_at < timedelta(days=7)
+            stress_trend = {
+                'recent': round(trend.ewma, 1),
+                'direction': trend.direction if recent_change else None,
             }
-            
-            total_stress = 0
-            for conv in conversations:
-                total_stress += stress_map.get(conv.detected_emotion, 3)
-            
-            avg_stress = round(total_stress / len(conversations), 1)
-            
-            if avg_stress >= 7:
-                stress_icon = "🔴"
-            elif avg_stress >= 4:
-                stress_icon = "🟡"
-            else:
-                stress_icon = "🟢"
         
         return render_template('profile.html',
                              username=current_user.username,
@@ -290,7 +796,8 @@ def profile():
                              last_active=last_active,
                              emotion_stats=emotion_counts,
                              avg_stress=avg_stress,
-                             stress_icon=stress_icon)
+                             stress_icon=stress_icon,
+                             stress_trend=stress_trend)
     except Exception as e:
         logger.error(f"Profile error: {e}")
         return "Profile loading error", 500
@@ -303,34 +810,11 @@ def profile():
 @login_required
 def mood_tracker():
     try:
-        conversations = Conversation.query.filter_by(user_id=current_user.id)\
-                        .order_by(Conversation.timestamp).all()
-        
-        dates = []
-        emotion_data = []
-        emotion_counts = {}
-        
-        emotion_map = {
-            'Exam Stress': 1,
-            'Work Pressure': 2,
-            'Sadness': 3,
-            'Anxiety': 4,
-            'Anger/Frustration': 5,
-            'Burnout/Exhaustion': 6,
-            'Relationship Concern': 7,
-            'Gentle Conversation': 8,
-            'Happiness': 9
-        }
+        # Totals from the stats row; the chart loads its series from /api/mood
+        stats = db.session.get(UserStats, current_user.id)
+        emotion_counts = dict(stats.emotion_counts) if stats else {}
         
-        for conv in conversations:
-            date_str = conv.timestamp.strftime('%b %d')
-            dates.append(date_str)
-            
-            emotion = conv.detected_emotion
-            emotion_data.append(emotion_map.get(emotion, 5))
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-        
-        total_chats = len(conversations)
+        total_chats = stats.conversations if stats else 0
         unique_emotions = len(emotion_counts)
         
         most_common = 'N/A'
@@ -338,16 +822,81 @@ def mood_tracker():
             most_common = max(emotion_counts, key=emotion_counts.get)
         
         return render_template('mood_tracker.html',
-                             dates=dates,
-                             emotion_data=emotion_data,
                              emotion_counts=emotion_counts,
                              total_chats=total_chats,
                              unique_emotions=unique_emotions,
-                             most_common=most_common)
+                             most_common=most_common,
+                             mood_ranges=MOOD_RANGES)
     except Exception as e:
         logger.error(f"Mood tracker error: {e}")
         return "Mood tracker error", 500
 
+# -------------------------------------------------------------------
+# API Mood Series (e.g. /api/mood?days=90&bucket=auto&points=60)
+# -------------------------------------------------------------------
+
+MOOD_RANGES = (7, 30, 90, 365)
+MOOD_MAX_DAYS = 3660
+MOOD_MAX_POINTS = 120
+
+@app.route('/api/mood')
+@login_required
+def mood_series():
+    try:
+        try:
+            days = int(request.args.get('days', 30))
+            points = int(request.args.get('points', 60))
+        except ValueError:
+            return {'error': 'days and points must be whole numbers'}, 400
+        bucket = request.args.get('bucket', 'auto')
+        if bucket != 'auto' and bucket not in MOOD_PERIODS:
+            return {'error': f"bucket must be auto, {' or '.join(MOOD_PERIODS)}"}, 400
+        days = min(max(days, 1), MOOD_MAX_DAYS)
+        points = min(max(points, 2), MOOD_MAX_POINTS)
+        
+        # Daily rollups while they fit in the requested points, weekly beyond that
+        period = bucket if bucket != 'auto' else ('day' if days <= points else 'week')
+        step = timedelta(days=7 if period == 'week' else 1)
+        end = period_start(datetime.utcnow(), 'day') + timedelta(days=1)
+        first = period_start(end - timedelta(days=days), period)
+        buckets = -(-(end - first) // step)
+        # Merge neighbouring rollups so the chart never gets more than ``points`` points
+        per_point = -(-buckets // points)
+        size = -(-buckets // per_point)
+        
+        conversations = [0] * size
+        mood_sums = [0.0] * size
+        stress_sums = [0.0] * size
+        stress_counts = [0] * size
+        emotions = [{} for _ in range(size)]
+        rollups = MoodRollup.query.filter(MoodRollup.user_id == current_user.id, MoodRollup.period == period,
+                                          MoodRollup.start >= first, MoodRollup.start < end).all()
+        for rollup in rollups:
+            i = (rollup.start - first) // step // per_point
+            conversations[i] += rollup.conversations
+            mood_sums[i] += rollup.mood_sum
+            stress_sums[i] += rollup.stress_sum
+            stress_counts[i] += rollup.stress_count
+            for emotion, count in rollup.emotion_counts.items():
+                emotions[i][emotion] = emotions[i].get(emotion, 0) + count
+        
+        # Columnar arrays, null where there were no conversations
+        return {
+            'period': period,
+            'start': first.date().isoformat(),
+            'step_days': step.days * per_point,
+            'labels': [(first + i * per_point * step).strftime('%b %d') for i in range(size)],
+            'count': conversations,
+            'mood': [round(mood_sums[i] / conversations[i], 2) if conversations[i] > 0 else None
+                     for i in range(size)],
+            'stress': [round(stress_sums[i] / stress_counts[i], 2) if stress_counts[i] > 0 else None
+                       for i in range(size)],
+            'emotion': [max(counts, key=counts.get) if counts else None for counts in emotions]
+        }
+    except Exception as e:
+        logger.error(f"Mood API error: {e}")
+        return {'error': 'Something went wrong'}, 500
+
 # -------------------------------------------------------------------
 # Journal Routes
 # -------------------------------------------------------------------
@@ -381,6 +930,10 @@ def add_journal():
         
         db.session.add(new_entry)
         db.session.commit()
+
+        # Emotion tagging happens in the background so long entries post instantly
+        if app.config['JOURNAL_TAGGING'] == 'background':
+            journal_tagger.notify()
         
         return redirect(url_for('journal'))
     except Exception as e:
@@ -439,23 +992,26 @@ def save_favorite():
         if not tip_text:
             return {'error': 'No tip provided'}, 400
         
-        existing = FavoriteTip.query.filter_by(
-            user_id=current_user.id, 
-            tip_text=tip_text
-        ).first()
-        
-        if existing:
-            return {'message': 'Tip already saved'}, 200
-        
-        new_tip = FavoriteTip(
+        # One statement: the unique (user_id, tip_hash) index turns a repeat save into a no-op
+        from sqlalchemy.dialects.sqlite import insert
+        age_group = get_age_group(current_user.age)
+        inserted = db.session.execute(insert(FavoriteTip).values(
             user_id=current_user.id,
             tip_text=tip_text,
+            tip_hash=hash_tip(tip_text),
             emotion=emotion,
-            saved_from='Chat Conversation'
-        )
+            saved_from='Chat Conversation',
+            age_group=age_group,
+            created_at=datetime.utcnow()
+        ).on_conflict_do_nothing(index_elements=['user_id', 'tip_hash'])).rowcount
+        
+        if not inserted:
+            db.session.rollback()
+            return {'message': 'Tip already saved'}, 200
         
-        db.session.add(new_tip)
+        bump_tip_popularity(emotion, age_group, tip_text, 1)
         db.session.commit()
+        adjust_tip_popularity(emotion, age_group, tip_text, 1)
         
         return {'message': 'Tip saved successfully'}, 200
     except Exception as e:
@@ -471,8 +1027,11 @@ def delete_favorite(id):
         if tip.user_id != current_user.id:
             return "Unauthorized", 403
         
+        age_group = tip.age_group or get_age_group(current_user.age)
         db.session.delete(tip)
+        bump_tip_popularity(tip.emotion or 'General', age_group, tip.tip_text, -1)
         db.session.commit()
+        adjust_tip_popularity(tip.emotion or 'General', age_group, tip.tip_text, -1)
         
         return redirect(url_for('favorites'))
     except Exception as e:
@@ -504,32 +1063,229 @@ def detect():
         
         if not message:
             return {'error': 'Tell me what\'s on your mind, sweetheart'}, 400
+        if len(message) > app.config['MAX_MESSAGE_LENGTH']:
+            return {'error': 'That message is a little too long for me, dear. Could you shorten it?'}, 413
         
-        # Get emotion detection response WITH AGE
-        response = detect_emotion_and_respond(message, age)
+        # Get emotion detection response WITH AGE, reading follow-ups in context
+        context = conversation_context.recent(current_user.id)
+        started = time.perf_counter()
+        try:
+            response = detector.run(detect_emotion_and_respond, message, age, context=context)
+        except (DetectorBusy, DetectorTimeout) as e:
+            logger.warning(f"Detection unavailable: {type(e).__name__}")
+            return {'error': 'I\'m a little overwhelmed right now. Please try again in a moment.'}, 503, {'Retry-After': '1'}
+        latency_ms = (time.perf_counter() - started) * 1000
+        if app.config['TIP_RANKING']:
+            response = rank_tips(response, get_age_group(age), app.config['TIP_RANKING'])
         
         # Save to database
         conversation = Conversation(
             user_id=current_user.id,
             user_message=message,
-            bot_response=response['caring_response'],
-            detected_emotion=response['emotion']
+            bot_response=response.caring_response,
+            detected_emotion=response.emotion,
+            stress_score=response.stress_score
         )
         db.session.add(conversation)
+        db.session.flush()
+        record_user_stats(current_user.id, [conversation])
+        record_mood_rollups(current_user.id, [conversation])
+        record_stress(current_user.id, [response.stress_score])
         db.session.commit()
-        
-        return {
-            'emotion': response['emotion'],
-            'stress_score': response['stress_score'],
-            'stress_level': response['stress_level'],
-            'stress_icon': response['stress_icon'],
-            'caring_response': response['caring_response'],
-            'tips': response['tips']
-        }
+        # The buffer keeps the message's own emotion, so a carried-over one doesn't chain
+        conversation_context.record(current_user.id, message, turn_emotion(message), response.stress_score)
+
+        # Sampled requests are re-run through the candidate engine in the background
+        shadow.submit(message, age, context, response, latency_ms)
+
+        # Body is serialized once per response variant, not per request
+        return Response(response.body, mimetype='application/json')
     except Exception as e:
         logger.error(f"Detect API error: {e}")
         return {'error': 'Something went wrong'}, 500
 
+# -------------------------------------------------------------------
+# API Detect Emotion - Batch (offline replay from the mobile client)
+# -------------------------------------------------------------------
+
+MAX_DETECT_BATCH = 100
+
+def parse_client_timestamp(value):
+    """Parse an ISO 8601 timestamp from a client as naive UTC; raises ValueError if it isn't one"""
+    if not isinstance(value, str):
+        raise ValueError(f"timestamp must be an ISO 8601 string, not {value!r}")
+    # fromisoformat only accepts a trailing Z from Python 3.11
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def previous_messages(rows, max_age):
+    """Map each row's id to the ``(user_message, timestamp)`` said just before it by the same user.
+
+    One query for all ``rows``, ordered by (timestamp, id) as the turns were
+    sent. Only conversations within ``max_age`` seconds before the rows are
+    read, so rows whose previous turn is older than that map to ``None``.
+    """
+    ordering = (Conversation.timestamp, Conversation.id)
+    turns = db.session.query(
+        Conversation.id,
+        db.func.lag(Conversation.user_message).over(partition_by=Conversation.user_id, order_by=ordering)
+          .label('previous_message'),
+        db.func.lag(Conversation.timestamp, type_=db.DateTime).over(partition_by=Conversation.user_id, order_by=ordering)
+          .label('previous_timestamp'),
+    ).filter(
+        Conversation.user_id.in_({row.user_id for row in rows}),
+        Conversation.timestamp.between(min(row.timestamp for row in rows) - timedelta(seconds=max_age),
+                                       max(row.timestamp for row in rows)),
+    ).subquery()
+    found = db.session.query(turns).filter(turns.c.id.in_([row.id for row in rows]))
+    return {turn.id: (turn.previous_message, turn.previous_timestamp)
+            for turn in found if turn.previous_message is not None}
+
+def replay_follow_ups(rows, results, engine=None, age=20):
+    """Re-detect follow-up replies with the turn before them, as /api/detect reads them.
+
+    ``rows`` are saved conversations (``id``, ``user_id``, ``user_message``,
+    ``timestamp``) and ``results`` their detections without context. The
+    previous turn keeps its message's own emotion, like the context buffer,
+    and its age is measured from when the reply was sent. Returns the
+    updated results.
+    """
+    lexicon = current_lexicon()
+    follow_ups = [i for i, row in enumerate(rows)
+                  if row.timestamp is not None and is_follow_up(row.user_message, lexicon)]
+    results = list(results)
+    if not follow_ups:
+        return results
+    previous = previous_messages([rows[i] for i in follow_ups], lexicon.follow_up_max_age)
+    for i in follow_ups:
+        row = rows[i]
+        if row.id not in previous:
+            continue
+        message, timestamp = previous[row.id]
+        turn = Turn(message, turn_emotion(message, engine), None, timestamp.replace(tzinfo=timezone.utc).timestamp())
+        results[i] = detect_emotion_and_respond(row.user_message, age, engine, context=[turn],
+                                                now=row.timestamp.replace(tzinfo=timezone.utc).timestamp())
+    return results
+
+@app.route('/api/detect/batch', methods=['POST'])
+@login_required
+def detect_batch():
+    try:
+        data = request.get_json()
+        items = data.get('messages', [])
+        age = data.get('age', 20)
+
+        if not isinstance(items, list) or not items:
+            return {'error': 'No messages provided'}, 400
+        if len(items) > MAX_DETECT_BATCH:
+            return {'error': f'At most {MAX_DETECT_BATCH} messages per batch'}, 400
+
+        # Each item is a message string or {"message": ..., "timestamp": ...}
+        messages = []
+        timestamps = []
+        for item in items:
+            if isinstance(item, dict):
+                messages.append(item.get('message', ''))
+                timestamps.append(item.get('timestamp'))
+            else:
+                messages.append(item)
+                timestamps.append(None)
+        if not all(isinstance(message, str) and message for message in messages):
+            return {'error': 'Every message must be non-empty text'}, 400
+        try:
+            timestamps = [parse_client_timestamp(timestamp) if timestamp is not None else None
+                          for timestamp in timestamps]
+        except ValueError:
+            return {'error': 'Every timestamp must be an ISO 8601 date and time'}, 400
+        if any(len(message) > app.config['MAX_MESSAGE_LENGTH'] for message in messages):
+            return {'error': 'One of the messages is too long'}, 413
+
+        try:
+            responses = detector.run(detect_emotions_batch, messages, age)
+        except (DetectorBusy, DetectorTimeout) as e:
+            logger.warning(f"Batch detection unavailable: {type(e).__name__}")
+            return {'error': 'I\'m a little overwhelmed right now. Please try again in a moment.'}, 503, {'Retry-After': '1'}
+
+        # Save every conversation in a single transaction
+        conversations = [Conversation(
+            user_id=current_user.id,
+            user_message=message,
+            bot_response=response.caring_response,
+            detected_emotion=response.emotion,
+            stress_score=response.stress_score,
+            timestamp=timestamp or datetime.utcnow()
+        ) for message, timestamp, response in zip(messages, timestamps, responses)]
+        db.session.add_all(conversations)
+        db.session.flush()
+        # Follow-up replies read the turn before them, as /api/detect and the reclassify job do
+        own_emotions = [response.emotion for response in responses]
+        responses = replay_follow_ups(conversations, responses, age=age)
+        for conversation, response in zip(conversations, responses):
+            conversation.bot_response = response.caring_response
+            conversation.detected_emotion = response.emotion
+            conversation.stress_score = response.stress_score
+        if app.config['TIP_RANKING']:
+            responses = [rank_tips(response, get_age_group(age), app.config['TIP_RANKING'])
+                         for response in responses]
+        record_user_stats(current_user.id, conversations)
+        record_mood_rollups(current_user.id, conversations)
+        record_stress(current_user.id, [response.stress_score for response in responses])
+        db.session.commit()
+        for message, emotion, response in zip(messages, own_emotions, responses):
+            conversation_context.record(current_user.id, message, emotion, response.stress_score)
+
+        body = b'{"results":[' + b','.join(response.body for response in responses) + b']}'
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Detect batch API error: {e}")
+        return {'error': 'Something went wrong'}, 500
+
+# -------------------------------------------------------------------
+# API Tips Search (e.g. /api/tips/search?q=breathe&emotion=Anxiety&age=16)
+# -------------------------------------------------------------------
+
+MAX_TIPS_PER_PAGE = 50
+
+@app.route('/api/tips/search')
+@login_required
+def tips_search():
+    try:
+        query = request.args.get('q', '')
+        emotion = request.args.get('emotion')
+        age_group = request.args.get('age_group')
+        if not age_group and request.args.get('age'):
+            try:
+                age_group = get_age_group(int(request.args['age']))
+            except ValueError:
+                return {'error': 'age must be a whole number'}, 400
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+
+        if age_group and age_group not in AGE_GROUPS:
+            return {'error': f'age_group must be one of {", ".join(AGE_GROUPS)}'}, 400
+        if page < 1 or not 1 <= per_page <= MAX_TIPS_PER_PAGE:
+            return {'error': f'page must be 1 or more and per_page between 1 and {MAX_TIPS_PER_PAGE}'}, 400
+
+        total, tips = search_tips(query, emotion, age_group, page, per_page)
+        return jsonify({
+            'query': query,
+            'emotion': emotion,
+            'age_group': age_group,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'results': [{'tip': tip.text, 'emotion': tip.emotion, 'age_groups': list(tip.age_groups)}
+                        for tip in tips]
+        })
+    except Exception as e:
+        logger.error(f"Tips search error: {e}")
+        return {'error': 'Something went wrong'}, 500
+
 # -------------------------------------------------------------------
 # History Page
 # -------------------------------------------------------------------
@@ -597,6 +1353,7 @@ def export_data():
                 'user_message': conv.user_message,
                 'bot_response': conv.bot_response,
                 'detected_emotion': conv.detected_emotion,
+                'stress_score': conv.stress_score,
                 'timestamp': conv.timestamp.isoformat() if conv.timestamp else None
             })
         
@@ -650,7 +1407,13 @@ def import_data():
         if imported_data.get('username') != current_user.username:
             return "Warning: This backup belongs to a different user. Import anyway?", 400
         
-        # Clear existing data
+        # Clear existing data; the replaced favorites no longer count towards tip popularity
+        popularity_changes = [
+            (emotion or 'General', age_group or get_age_group(current_user.age), tip_text, -1)
+            for emotion, age_group, tip_text in db.session.query(FavoriteTip.emotion, FavoriteTip.age_group,
+                                                                 FavoriteTip.tip_text)
+                                                          .filter_by(user_id=current_user.id)
+        ]
         Conversation.query.filter_by(user_id=current_user.id).delete()
         Journal.query.filter_by(user_id=current_user.id).delete()
         FavoriteTip.query.filter_by(user_id=current_user.id).delete()
@@ -662,6 +1425,7 @@ def import_data():
                 user_message=conv_data['user_message'],
                 bot_response=conv_data['bot_response'],
                 detected_emotion=conv_data['detected_emotion'],
+                stress_score=conv_data.get('stress_score'),
                 timestamp=datetime.fromisoformat(conv_data['timestamp']) if conv_data.get('timestamp') else datetime.utcnow()
             )
             db.session.add(conv)
@@ -677,18 +1441,34 @@ def import_data():
             )
             db.session.add(journal)
         
-        # Import favorite tips
+        # Import favorite tips, counted under the importing user's age group like a new save
+        age_group = get_age_group(current_user.age)
+        imported_hashes = set()
         for tip_data in imported_data.get('favorite_tips', []):
+            tip_hash = hash_tip(tip_data['tip_text'])
+            if tip_hash in imported_hashes:
+                continue
+            imported_hashes.add(tip_hash)
             tip = FavoriteTip(
                 user_id=current_user.id,
                 tip_text=tip_data['tip_text'],
+                tip_hash=tip_hash,
                 emotion=tip_data['emotion'],
                 saved_from=tip_data.get('saved_from', 'Imported'),
+                age_group=age_group,
                 created_at=datetime.fromisoformat(tip_data['created_at']) if tip_data.get('created_at') else datetime.utcnow()
             )
             db.session.add(tip)
+            popularity_changes.append((tip_data['emotion'] or 'General', age_group, tip_data['tip_text'], 1))
         
+        for change in popularity_changes:
+            bump_tip_popularity(*change)
+        db.session.flush()
+        rebuild_user_stats([current_user.id])
+        rebuild_mood_rollups([current_user.id])
         db.session.commit()
+        for change in popularity_changes:
+            adjust_tip_popularity(*change)
         
         return redirect(url_for('profile'))
         
@@ -736,6 +1516,54 @@ def debug_database():
 def health():
     return {"status": "healthy", "database": db_path}, 200
 
+# -------------------------------------------------------------------
+# Database Migrations (columns added after a table was first created)
+# -------------------------------------------------------------------
+
+# (table, column, SQLite column definition); create_all() never alters existing tables
+ADDED_COLUMNS = [
+    ('journal', 'detected_emotion', 'VARCHAR(100)'),
+    ('journal', 'stress_score', 'FLOAT'),
+    ('journal', 'tagged_at', 'DATETIME'),
+    ('favorite_tip', 'age_group', 'VARCHAR(20)'),
+    ('favorite_tip', 'tip_hash', 'VARCHAR(64)'),
+    ('conversation', 'stress_score', 'FLOAT'),
+]
+
+def migrate_columns():
+    """Add any ADDED_COLUMNS missing from an existing database"""
+    from sqlalchemy import inspect, text
+    inspector = inspect(db.engine)
+    existing = {}
+    for table, column, definition in ADDED_COLUMNS:
+        if table not in existing:
+            existing[table] = {info['name'] for info in inspector.get_columns(table)}
+        if column not in existing[table]:
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}'))
+            existing[table].add(column)
+            logger.info(f"🛠️ Added column {table}.{column}")
+
+def backfill_tip_hashes():
+    """Hash favorites saved before tip_hash existed and drop repeat saves, so the unique index can be built"""
+    rows = db.session.query(FavoriteTip.id, FavoriteTip.tip_text).filter(FavoriteTip.tip_hash.is_(None)).all()
+    if not rows:
+        return
+    db.session.execute(db.update(FavoriteTip), [
+        {'id': favorite_id, 'tip_hash': hash_tip(tip_text)} for favorite_id, tip_text in rows
+    ])
+    keep = db.session.query(db.func.min(FavoriteTip.id))\
+             .group_by(FavoriteTip.user_id, FavoriteTip.tip_hash).scalar_subquery()
+    duplicates = FavoriteTip.query.filter(FavoriteTip.id.not_in(keep)).delete(synchronize_session=False)
+    db.session.commit()
+    logger.info(f"🛠️ Hashed {len(rows)} favorite tips, removed {duplicates} duplicates")
+
+def migrate_indexes():
+    """Create indexes declared on the models that an existing database doesn't have yet"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 # -------------------------------------------------------------------
 # Initialize Database
 # -------------------------------------------------------------------
@@ -744,6 +1572,9 @@ def init_database():
         try:
             # Force create all tables
             db.create_all()
+            migrate_columns()
+            backfill_tip_hashes()
+            migrate_indexes()
             logger.info("✅ Database tables created successfully")
             
             # Verify tables exist
@@ -765,6 +1596,263 @@ def init_database():
 # Initialize database
 init_database()
 
+# Tip popularity: count older favorites once, then keep an in-memory copy fresh
+with app.app_context():
+    try:
+        seed_tip_popularity()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"❌ Tip popularity seeding error: {e}")
+
+# Conversation stats and mood rollups for users whose history predates them
+with app.app_context():
+    try:
+        seed_user_stats()
+        seed_mood_rollups()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"❌ User stats seeding error: {e}")
+
+# Background threads start with each process's first request, not at import,
+# so every gunicorn worker runs its own even when the app is preloaded
+@app.before_request
+def start_background_tasks():
+    if app.config['TIP_RANKING']:
+        tip_popularity_refresher.start()
+    # Its first pass picks up entries left untagged by a restart or added before tagging existed
+    if app.config['JOURNAL_TAGGING'] == 'background':
+        journal_tagger.start()
+    if app.config['DB_MAINTENANCE'] == 'background':
+        database_maintainer.start()
+
+# -------------------------------------------------------------------
+# CLI - Train Emotion Classifier (flask --app app train-classifier)
+# -------------------------------------------------------------------
+
+@app.cli.command('train-classifier')
+@click.option('--output', default=None, help='Where to write the .npz model (default: instance/emotion_model.npz)')
+@click.option('--features', default=2 ** 15, show_default=True, help='Number of hashed feature buckets')
+@click.option('--alpha', default=0.5, show_default=True, help='Additive smoothing')
+def train_classifier_command(output, features, alpha):
+    """Train the 'model' detection engine from saved conversations"""
+    rows = db.session.query(Conversation.user_message, Conversation.detected_emotion)\
+             .order_by(Conversation.id).yield_per(1000)
+    messages = []
+    emotions = []
+    for message, emotion in rows:
+        messages.append(message)
+        emotions.append(emotion)
+    try:
+        model, examples = train_classifier(messages, emotions, path=output,
+                                           n_features=features, alpha=alpha)
+    except (RuntimeError, ValueError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"🧠 Trained on {examples} of {len(messages)} conversations, "
+               f"{len(model.labels)} emotions: {', '.join(model.labels)}")
+
+# -------------------------------------------------------------------
+# CLI - Reclassify Conversations (flask --app app reclassify-conversations)
+# -------------------------------------------------------------------
+
+def get_checkpoint(name, version, restart=False):
+    """Load job ``name``'s checkpoint, starting over when ``version`` changed or ``restart`` is set"""
+    checkpoint = JobCheckpoint.query.filter_by(name=name).first()
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name=name, version=version, last_id=0, processed=0, changed=0)
+        db.session.add(checkpoint)
+    elif restart or checkpoint.version != version:
+        checkpoint.version = version
+        checkpoint.last_id = checkpoint.processed = checkpoint.changed = 0
+        checkpoint.started_at = datetime.utcnow()
+        checkpoint.finished_at = None
+    db.session.commit()
+    return checkpoint
+
+def reclassify_user_stats(changed_rows):
+    """Move relabeled conversations between emotions in their users' stats and rollups; the caller commits"""
+    by_user = {}
+    for row, result in changed_rows:
+        by_user.setdefault(row.user_id, []).append((row, result))
+    for user_stats in UserStats.query.filter(UserStats.user_id.in_(by_user)).all():
+        emotion_counts = dict(user_stats.emotion_counts)
+        for row, result in by_user[user_stats.user_id]:
+            old_emotion = row.detected_emotion or 'Unknown'
+            emotion_counts[old_emotion] = emotion_counts.get(old_emotion, 1) - 1
+            if emotion_counts[old_emotion] <= 0:
+                del emotion_counts[old_emotion]
+            emotion_counts[result.emotion] = emotion_counts.get(result.emotion, 0) + 1
+            if row.stress_score is None:
+                user_stats.stress_count += 1
+            else:
+                user_stats.stress_sum -= row.stress_score
+            user_stats.stress_sum += result.stress_score
+        user_stats.emotion_counts = emotion_counts
+    for user_id, changes in by_user.items():
+        adjust_mood_rollups(user_id, [
+            change
+            for row, result in changes if row.timestamp is not None
+            for change in ((row.timestamp, row.detected_emotion, row.stress_score, -1),
+                           (row.timestamp, result.emotion, result.stress_score, 1))
+        ])
+
+@app.cli.command('reclassify-conversations')
+@click.option('--chunk-size', default=500, show_default=True, help='Rows read, classified and committed at a time')
+@click.option('--pause', default=0.05, show_default=True, help='Seconds to wait between chunks, leaving room for live writes')
+@click.option('--engine', type=click.Choice(sorted(ENGINES)), default=None, help='Detection engine (default: the configured engine)')
+@click.option('--restart', is_flag=True, help='Ignore saved progress and start from the first row')
+def reclassify_conversations_command(chunk_size, pause, engine, restart):
+    """Re-run detection over saved conversations after a lexicon change, resuming where it stopped"""
+    engine = engine or DEFAULT_ENGINE
+    lexicon = current_lexicon()
+    version = f"{engine}:{'.'.join(map(str, lexicon.version))}"
+    checkpoint = get_checkpoint('reclassify-conversations', version, restart)
+    if checkpoint.finished_at is not None:
+        click.echo(f"✅ Conversations are already classified with {version}; use --restart to run again")
+        return
+    if checkpoint.last_id:
+        click.echo(f"↩️ Resuming after conversation {checkpoint.last_id} ({checkpoint.processed} done)")
+
+    while True:
+        # Read outside any write transaction; only the update below takes the write lock
+        rows = db.session.query(Conversation.id, Conversation.user_id, Conversation.user_message,
+                                Conversation.detected_emotion, Conversation.stress_score,
+                                Conversation.timestamp)\
+                 .filter(Conversation.id > checkpoint.last_id)\
+                 .order_by(Conversation.id).limit(chunk_size).all()
+        db.session.rollback()
+        if not rows:
+            break
+
+        results = detect_emotions_batch([row.user_message for row in rows], engine=engine)
+        results = replay_follow_ups(rows, results, engine)
+        changed_rows = [(row, result) for row, result in zip(rows, results)
+                        if result.emotion != row.detected_emotion or result.stress_score != row.stress_score]
+        changes = [{'id': row.id, 'detected_emotion': result.emotion, 'stress_score': result.stress_score}
+                   for row, result in changed_rows]
+        try:
+            if changes:
+                db.session.execute(db.update(Conversation), changes)
+                reclassify_user_stats(changed_rows)
+            checkpoint.last_id = rows[-1].id
+            checkpoint.processed += len(rows)
+            checkpoint.changed += len(changes)
+            checkpoint.updated_at = datetime.utcnow()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        click.echo(f"📦 Up to conversation {checkpoint.last_id}: {checkpoint.processed} checked, "
+                   f"{checkpoint.changed} relabeled")
+        if pause:
+            time.sleep(pause)
+
+    checkpoint.finished_at = datetime.utcnow()
+    db.session.commit()
+    click.echo(f"✅ Reclassified {checkpoint.processed} conversations with {version}, "
+               f"{checkpoint.changed} changed")
+
+# -------------------------------------------------------------------
+# CLI - Tag Journal Entries (flask --app app tag-journals)
+# -------------------------------------------------------------------
+
+@app.cli.command('tag-journals')
+@click.option('--chunk-size', default=200, show_default=True, help='Entries tagged and committed at a time')
+@click.option('--retag', is_flag=True, help='Re-tag every entry, e.g. after a lexicon change, resuming where it stopped')
+def tag_journals_command(chunk_size, retag):
+    """Backfill detected emotions for journal entries in chunks"""
+    tagged = 0
+    if not retag:
+        while True:
+            count = tag_untagged_journals(chunk_size)
+            if not count:
+                break
+            tagged += count
+            click.echo(f"📦 {tagged} untagged entries tagged")
+        click.echo(f"✅ Tagged {tagged} journal entries")
+        return
+
+    version = '.'.join(map(str, current_lexicon().version))
+    checkpoint = get_checkpoint('tag-journals', version, restart=False)
+    if checkpoint.finished_at is not None:
+        checkpoint = get_checkpoint('tag-journals', version, restart=True)
+    while True:
+        entries = db.session.query(Journal.id, Journal.title, Journal.content)\
+                    .filter(Journal.id > checkpoint.last_id)\
+                    .order_by(Journal.id).limit(chunk_size).all()
+        if not entries:
+            break
+        try:
+            tag_journals(entries)
+            checkpoint.last_id = entries[-1].id
+            checkpoint.processed += len(entries)
+            checkpoint.updated_at = datetime.utcnow()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        click.echo(f"📦 Up to journal entry {checkpoint.last_id}: {checkpoint.processed} re-tagged")
+    checkpoint.finished_at = datetime.utcnow()
+    db.session.commit()
+    click.echo(f"✅ Re-tagged {checkpoint.processed} journal entries")
+
+# -------------------------------------------------------------------
+# CLI - Check Database Concurrency (flask --app app check-db-concurrency)
+# -------------------------------------------------------------------
+
+@app.cli.command('check-db-concurrency')
+@click.option('--hold', default=0.5, show_default=True, help='Seconds the writer holds its exclusive lock')
+@click.option('--readers', default=4, show_default=True, help='Concurrent reader threads')
+def check_db_concurrency_command(hold, readers):
+    """Show that readers don't wait on a writer with the configured pragmas (uses a scratch database)"""
+    configured = sqlite_pragmas(app.config)
+    rollback = sqlite_pragmas({**app.config, 'SQLITE_JOURNAL_MODE': 'DELETE'})
+    results = {}
+    for label, statements in (('rollback journal', rollback), (app.config['SQLITE_JOURNAL_MODE'], configured)):
+        waits = sorted(measure_reader_waits(statements, hold=hold, readers=readers))
+        results[label] = waits[-1]
+        click.echo(f"📊 {label}: {len(waits)} reads, median {waits[len(waits) // 2] * 1000:.1f}ms, "
+                   f"max {waits[-1] * 1000:.1f}ms")
+    if results[app.config['SQLITE_JOURNAL_MODE']] >= hold / 2:
+        raise click.ClickException(f"Readers waited on the writer in {app.config['SQLITE_JOURNAL_MODE']} mode")
+    click.echo("✅ Readers did not wait on the writer")
+
+# -------------------------------------------------------------------
+# CLI - Database Maintenance (flask --app app maintain-db, e.g. from cron)
+# -------------------------------------------------------------------
+
+@app.cli.command('maintain-db')
+@click.option('--budget', default=5.0, show_default=True, help='Seconds of incremental vacuum before stopping')
+@click.option('--checkpoint', type=click.Choice([mode.lower() for mode in CHECKPOINT_MODES]), default='truncate',
+              show_default=True, help='WAL checkpoint mode; truncate also shrinks the -wal file')
+@click.option('--enable-incremental-vacuum', 'convert', is_flag=True,
+              help='One-off: switch an existing database to incremental auto-vacuum (runs a full VACUUM)')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+def maintain_db_command(budget, checkpoint, convert, as_json):
+    """Refresh statistics, vacuum free pages and checkpoint the WAL, then report what changed"""
+    if convert:
+        connection = db.engine.raw_connection()
+        try:
+            stats = enable_incremental_vacuum(connection.driver_connection)
+        finally:
+            connection.close()
+        click.echo(f"🛠️ auto_vacuum is now {stats['auto_vacuum']}, file is {stats['file_bytes']} bytes")
+
+    report = maintain_database(budget=budget, checkpoint=checkpoint)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+        return
+    before, after = report['before'], report['after']
+    if after['auto_vacuum'] != 'INCREMENTAL':
+        click.echo(f"⚠️ auto_vacuum is {after['auto_vacuum']}, free pages are only reused, not released; "
+                   f"run once with --enable-incremental-vacuum")
+    click.echo(f"📁 File size: {before['file_bytes']} -> {after['file_bytes']} bytes")
+    click.echo(f"📄 Free pages: {before['freelist_count']} -> {after['freelist_count']} "
+               f"({report['vacuumed_pages']} vacuumed, page size {after['page_size']})")
+    checkpoint = report['checkpoint']
+    click.echo(f"📝 WAL checkpoint ({checkpoint['mode']}): {checkpoint['checkpointed']} of "
+               f"{checkpoint['wal_frames']} frames{', busy' if checkpoint['busy'] else ''}")
+    click.echo(f"✅ Maintenance finished in {report['duration_ms']}ms")
+
 # -------------------------------------------------------------------
 # Run App
 # -------------------------------------------------------------------
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LazyThread:
+    """A daemon thread running ``target``, started on first use in each process.
+
+    ``start`` is cheap enough to call on every use. It remembers which
+    process started the thread, so a process forked afterwards (gunicorn
+    ``--preload`` imports the app in the master) starts its own thread
+    rather than counting on one that only runs in its parent.
+    """
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+                    self._thread.start()
+                    self._pid = pid
+
+    def join(self, timeout=None):
+        """Wait for this process's thread to finish, if it was started here"""
+        if self._pid == os.getpid():
+            self._thread.join(timeout)
+
+
+class BackgroundBatchWorker:
+    """Calls ``work()`` on a daemon thread until it reports nothing left to do.
+
+    ``work`` processes one batch and returns how many items it handled. The
+    worker keeps calling it while it returns more than zero, then sleeps
+    until ``notify`` is called or ``interval`` seconds pass, so new work is
+    picked up promptly and anything missed is picked up eventually.
+    """
+
+    def __init__(self, work, interval=30.0, name='batch-worker'):
+        self.work = work
+        self.interval = interval
+        self.name = name
+        self.processed = 0
+        self._wake = threading.Event()
+        self._thread = LazyThread(self._run, name)
+
+    def start(self):
+        self._thread.start()
+
+    def notify(self):
+        """Wake the worker now rather than at its next interval"""
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                while True:
+                    handled = self.work()
+                    self.processed += handled
+                    if not handled:
+                        break
+            except Exception as e:
+                logger.error(f"{self.name} failed: {e}")
+            self._wake.wait(self.interval)
+
+
+class PeriodicTask:
+    """Calls ``task()`` on a daemon thread every ``interval`` seconds.
+
+    For work that runs on a schedule rather than draining a backlog, like
+    refreshing a cache; the first call happens as soon as it starts. Once
+    stopped, a task stays stopped.
+    """
+
+    def __init__(self, task, interval=60.0, name='periodic-task'):
+        self.task = task
+        self.interval = interval
+        self.name = name
+        self.runs = 0
+        self._stop = threading.Event()
+        self._thread = LazyThread(self._run, name)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the current call, waiting up to ``timeout`` seconds for it to finish"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                self.task()
+                self.runs += 1
+            except Exception as e:
+                logger.error(f"{self.name} failed: {e}")
+            if self._stop.wait(self.interval):
+                return
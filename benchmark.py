@@ -0,0 +1,380 @@
+"""Benchmark and accuracy harness for emotion_detection.
+
+    python benchmark.py                          # generated corpus, default engine
+    python benchmark.py --engine rules --engine scored
+    python benchmark.py --baseline benchmark_baseline.json
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --crisis-only                # just the crisis latency check
+
+Reports messages/sec, per-call latency percentiles, allocations per call
+and per-category accuracy for each engine. With ``--baseline`` it exits
+non-zero when throughput or accuracy falls past the stored numbers, or
+when any crisis message is missed.
+
+Every run also times the crisis fast path on 100k-character adversarial
+inputs and fails when any scan passes ``--crisis-budget-ms``, grows
+faster than linearly with input size, or gives a wrong answer.
+
+Throughput depends on the machine, so save a fresh baseline on the
+machine that runs the comparison.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import emotion_detection
+
+CORPUS_SEED = 20240501
+AGES = (15, 22, 40, 65)
+
+# expected emotion -> message templates; {n} is replaced by a negation
+TEMPLATES = {
+    'CRISIS - URGENT SUPPORT NEEDED': [
+        "I want to die", "sometimes I think about ending it all", "I feel worthless",
+        "I just want to kill myself", "there is no reason to live anymore",
+        "I can't go on like this", "everyone would be better off dead without me",
+    ],
+    'Greeting': ["hi", "hello there", "hey!", "good morning", "hola"],
+    'Gratitude': ["thank you so much", "thanks", "I appreciate it", "thx for listening"],
+    'Goodbye': ["bye", "see you tomorrow", "good night", "take care"],
+    'Introduction': ["who are you?", "what can you do", "tell me about yourself"],
+    'Help': ["I need help", "can you help me", "I need some support"],
+    'Happiness': [
+        "I am so happy today", "I got the job, I'm proud of myself", "what a wonderful day",
+        "I feel amazing after the trip", "I'm really glad it worked out",
+    ],
+    'Sadness': [
+        "I feel so lonely tonight", "I'm {n} happy at all", "I've been sad for days",
+        "I feel empty inside", "everything makes me miserable lately", "I'm heartbroken",
+    ],
+    'Exam Stress': [
+        "my exam is tomorrow and I haven't started", "I have so much homework",
+        "I'm going to fail this test", "my grade in this class is dropping",
+        "the assignment is due tonight", "I can't focus on my study plan",
+    ],
+    'Work Pressure': [
+        "my boss keeps piling on work", "the deadline at the office is impossible",
+        "there's so much pressure at my job", "back to back meetings all week",
+        "I'm worried about my career",
+    ],
+    'Anger/Frustration': [
+        "I'm so angry at my roommate", "this is really frustrating", "I hate how they treat me",
+        "I'm furious right now", "I'm annoyed with everyone",
+    ],
+    'Anxiety': [
+        "I'm so anxious about everything", "I keep having panic attacks", "I'm scared of the future",
+        "I'm so stressed", "I can't stop overthinking", "I'm nervous about tomorrow",
+    ],
+    'Burnout/Exhaustion': [
+        "I'm so tired", "I feel completely exhausted", "I'm totally drained",
+        "I'm burnt out", "I feel worn out all the time",
+    ],
+    'Relationship Concern': [
+        "I had a fight with my girlfriend", "my boyfriend and I had an argument",
+        "I think my relationship is falling apart", "my partner wants a divorce",
+        "my best friend stopped talking to me",
+    ],
+    'Gentle Conversation': [
+        "I'm {n} sad", "the weather is nice", "I had pasta for lunch", "just thinking out loud",
+        "what time is it",
+    ],
+}
+
+NEGATIONS = ("not", "never", "don't feel", "wasn't")
+FILLERS = (
+    "Today was a long day.", "I had lunch with my mom.", "It rained all afternoon.",
+    "The bus was late again.", "I'm writing this from my room.",
+)
+# Keyword typos the detector is expected to see through
+TYPO_RATE = 0.1
+
+
+def _misspell(message, rng):
+    words = message.split()
+    candidates = [i for i, word in enumerate(words) if len(word) >= 6 and word.isalpha()]
+    if not candidates:
+        return message
+    i = rng.choice(candidates)
+    word = words[i]
+    cut = rng.randrange(1, len(word) - 1)
+    words[i] = word[:cut] + word[cut + 1:]
+    return ' '.join(words)
+
+
+def generate_corpus(size=2000, seed=CORPUS_SEED):
+    """Build a labeled corpus of ``size`` messages across categories, lengths, negations and ages"""
+    rng = random.Random(seed)
+    emotions = sorted(TEMPLATES)
+    corpus = []
+    for index in range(size):
+        emotion = emotions[index % len(emotions)]
+        message = rng.choice(TEMPLATES[emotion]).replace('{n}', rng.choice(NEGATIONS))
+        if emotion != 'CRISIS - URGENT SUPPORT NEEDED' and rng.random() < TYPO_RATE:
+            message = _misspell(message, rng)
+        # Short, medium and long messages: the signal surrounded by filler sentences
+        padding = rng.choice((0, 0, 1, 3, 8))
+        before = [rng.choice(FILLERS) for _ in range(rng.randint(0, padding))]
+        after = [rng.choice(FILLERS) for _ in range(padding - len(before))]
+        if emotion not in ('Greeting', 'Gratitude', 'Goodbye', 'Introduction', 'Help'):
+            message = ' '.join(before + [message] + after)
+        corpus.append({'message': message, 'emotion': emotion, 'age': rng.choice(AGES)})
+    return corpus
+
+
+def load_corpus(path):
+    """Read a JSONL corpus of ``{"message", "emotion", "age"}`` objects"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_engine(engine, corpus, rounds=3):
+    """Measure one engine over ``corpus`` with the classification cache disabled"""
+    detect = emotion_detection.detect_emotion_and_respond
+    messages = [(item['message'], item.get('age', 20)) for item in corpus]
+    for message, age in messages[:100]:
+        detect(message, age, engine)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message, age in messages:
+            call_started = time.perf_counter_ns()
+            detect(message, age, engine)
+            latencies.append(time.perf_counter_ns() - call_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    # Allocations are measured in their own pass; tracing skews timings
+    tracemalloc.start()
+    peaks = 0
+    for message, age in messages:
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        detect(message, age, engine)
+        peaks += tracemalloc.get_traced_memory()[1] - current
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    totals = {}
+    correct = {}
+    crisis_missed = []
+    for item in corpus:
+        emotion = detect(item['message'], item.get('age', 20), engine).emotion
+        expected = item['emotion']
+        totals[expected] = totals.get(expected, 0) + 1
+        if emotion == expected:
+            correct[expected] = correct.get(expected, 0) + 1
+        elif expected == 'CRISIS - URGENT SUPPORT NEEDED':
+            crisis_missed.append(item['message'])
+
+    return {
+        'engine': engine,
+        'messages': len(latencies),
+        'messages_per_sec': round(len(latencies) / elapsed, 1),
+        'latency_us': {
+            'p50': round(_percentile(latencies, 0.50) / 1000, 1),
+            'p95': round(_percentile(latencies, 0.95) / 1000, 1),
+            'p99': round(_percentile(latencies, 0.99) / 1000, 1),
+            'max': round(latencies[-1] / 1000, 1),
+        },
+        'alloc_peak_bytes_per_call': round(peaks / len(messages)),
+        'alloc_retained_bytes': retained,
+        'accuracy': round(sum(correct.values()) / len(corpus), 4),
+        'category_accuracy': {
+            emotion: round(correct.get(emotion, 0) / total, 4) for emotion, total in sorted(totals.items())
+        },
+        'crisis_missed': crisis_missed,
+    }
+
+
+def compare(result, baseline, max_slowdown, max_accuracy_drop):
+    """Return the regressions of ``result`` against ``baseline``, as messages"""
+    failures = []
+    if result['crisis_missed']:
+        failures.append(f"missed {len(result['crisis_missed'])} crisis messages, e.g. {result['crisis_missed'][0]!r}")
+    if baseline is None:
+        return failures
+    floor = baseline['messages_per_sec'] * (1 - max_slowdown)
+    if result['messages_per_sec'] < floor:
+        failures.append(f"throughput {result['messages_per_sec']}/s is below {floor:.1f}/s "
+                        f"(baseline {baseline['messages_per_sec']}/s)")
+    if result['accuracy'] < baseline['accuracy'] - max_accuracy_drop:
+        failures.append(f"accuracy {result['accuracy']:.2%} fell from {baseline['accuracy']:.2%}")
+    for emotion, accuracy in result['category_accuracy'].items():
+        before = baseline['category_accuracy'].get(emotion)
+        if before is not None and accuracy < before - max_accuracy_drop:
+            failures.append(f"{emotion} accuracy {accuracy:.2%} fell from {before:.2%}")
+    return failures
+
+
+# ----------------------------------------------------------------------
+# CRISIS FAST PATH LATENCY
+# ----------------------------------------------------------------------
+
+CRISIS_INPUT_LENGTH = 100000
+
+
+def _repeat_to(text, length):
+    return (text * (length // len(text) + 1))[:length]
+
+
+def crisis_inputs(length=CRISIS_INPUT_LENGTH):
+    """Adversarial inputs for find_crisis_phrase as ``(name, message, should_match)``"""
+    phrases = emotion_detection.current_lexicon().crisis_phrases
+    # Every phrase minus its last letter, so the automaton keeps almost matching
+    near_misses = ' '.join(phrase[:-1] for phrase in phrases) + ' '
+    # Phrases glued into other words never match on a word boundary
+    glued = ''.join('x' + phrase.replace(' ', '') + 'x' for phrase in phrases)
+    hit = ' ' + phrases[0]
+    # Quoted and possessive mentions, each at the end of the near misses
+    quoted = [
+        ('single-quoted phrase', " I want to 'kill myself'"),
+        ('quoted sentence', " i keep thinking 'i want to die'"),
+        ('curly-quoted phrase', " ‘suicide’ is on my mind"),
+        ('possessive phrase', " suicide's the only way"),
+    ]
+    return [
+        ('near misses', _repeat_to(near_misses, length), False),
+        ('near misses, phrase at the end', _repeat_to(near_misses, length - len(hit)) + hit, True),
+    ] + [
+        (name, _repeat_to(near_misses, length - len(text)) + text, True) for name, text in quoted
+    ] + [
+        ('phrases inside words', _repeat_to(glued, length), False),
+        ('repeated first letters', _repeat_to(phrases[0][0], length), False),
+        ('punctuation and whitespace', _repeat_to(' .,!?\n\t', length), False),
+        ('non-ASCII letters', _repeat_to('ünïcødé ßtraße 自殺 ', length), False),
+    ]
+
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def crisis_latency(budget_ms, rounds=3):
+    """Time find_crisis_phrase on each adversarial input; returns ``(report, failures)``"""
+    report = []
+    failures = []
+    for name, message, should_match in crisis_inputs():
+        best = float('inf')
+        for _ in range(rounds):
+            started = time.perf_counter()
+            found = emotion_detection.find_crisis_phrase(message)
+            best = min(best, time.perf_counter() - started)
+        # A tenth of the input should take about a tenth of the time
+        small = message[-len(message) // 10:]
+        small_best = min(_timed(emotion_detection.find_crisis_phrase, small) for _ in range(rounds))
+        ms = best * 1000
+        report.append({'input': name, 'chars': len(message), 'ms': round(ms, 2),
+                       'ns_per_char': round(best * 1e9 / len(message), 1)})
+        if (found is not None) != should_match:
+            failures.append(f"crisis check on {name!r} returned {found!r}")
+        if ms > budget_ms:
+            failures.append(f"crisis check on {name!r} took {ms:.1f}ms, budget {budget_ms}ms")
+        # Generous margin for timer noise on the small input
+        if best > 20 * max(small_best, 1e-4):
+            failures.append(f"crisis check on {name!r} grows faster than linearly: "
+                            f"{small_best * 1000:.2f}ms for a tenth of the input, {ms:.1f}ms for all of it")
+    return report, failures
+
+
+def print_crisis_report(report):
+    print("\n== crisis fast path ==")
+    for row in report:
+        print(f"  {row['input']:<32} {row['chars']} chars  {row['ms']:>8} ms  {row['ns_per_char']:>7} ns/char")
+
+
+def print_report(result):
+    latency = result['latency_us']
+    print(f"\n== engine: {result['engine']} ==")
+    print(f"  throughput   {result['messages_per_sec']:>10} msgs/sec over {result['messages']} calls")
+    print(f"  latency us   p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"  allocations  {result['alloc_peak_bytes_per_call']} bytes peak per call, "
+          f"{result['alloc_retained_bytes']} bytes retained")
+    print(f"  accuracy     {result['accuracy']:.2%}")
+    for emotion, accuracy in result['category_accuracy'].items():
+        print(f"    {emotion:<32} {accuracy:.2%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark emotion detection engines")
+    parser.add_argument('--engine', action='append', choices=sorted(emotion_detection.ENGINES),
+                        help="engine to measure; repeat for several (default: the configured engine)")
+    parser.add_argument('--corpus', help="JSONL corpus to load instead of generating one")
+    parser.add_argument('--size', type=int, default=2000, help="generated corpus size")
+    parser.add_argument('--rounds', type=int, default=3, help="timed passes over the corpus")
+    parser.add_argument('--write-corpus', help="write the corpus used to this JSONL file")
+    parser.add_argument('--baseline', help="fail on regressions against this baseline JSON")
+    parser.add_argument('--save-baseline', help="write the results to this baseline JSON")
+    parser.add_argument('--max-slowdown', type=float, default=0.25,
+                        help="allowed throughput drop as a fraction of the baseline")
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                        help="allowed accuracy drop, overall and per category")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    parser.add_argument('--crisis-budget-ms', type=float, default=250,
+                        help="max time for one crisis check on a 100k-character input")
+    parser.add_argument('--crisis-only', action='store_true', help="only run the crisis latency check")
+    args = parser.parse_args(argv)
+
+    crisis_report, crisis_failures = crisis_latency(args.crisis_budget_ms)
+    if args.crisis_only:
+        print_crisis_report(crisis_report)
+        for failure in crisis_failures:
+            print(f"❌ {failure}", file=sys.stderr)
+        return 1 if crisis_failures else 0
+
+    corpus = load_corpus(args.corpus) if args.corpus else generate_corpus(args.size)
+    if args.write_corpus:
+        with open(args.write_corpus, 'w', encoding='utf-8') as f:
+            for item in corpus:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    baselines = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baselines = json.load(f)['engines']
+
+    # Measure the engines themselves, not the cache in front of them
+    emotion_detection.configure_cache(0)
+    results = []
+    failures = [f"[crisis] {failure}" for failure in crisis_failures]
+    for engine in args.engine or [emotion_detection.DEFAULT_ENGINE]:
+        result = run_engine(engine, corpus, args.rounds)
+        results.append(result)
+        failures += [f"[{engine}] {failure}" for failure in
+                     compare(result, baselines.get(engine) if args.baseline else None,
+                             args.max_slowdown, args.max_accuracy_drop)]
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        for result in results:
+            print_report(result)
+        print_crisis_report(crisis_report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'corpus_size': len(corpus),
+                       'engines': {result['engine']: result for result in results}},
+                      f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+    if failures:
+        print("\n❌ Regressions:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
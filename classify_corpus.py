@@ -0,0 +1,191 @@
+"""Stream a message corpus through emotion detection.
+
+    python -m classify_corpus messages.jsonl -o labeled.jsonl
+    python -m classify_corpus export.csv --text-field body --output-format csv -o labeled.csv
+    cat messages.jsonl | python -m classify_corpus - --workers 8 > labeled.jsonl
+
+Records are read lazily, classified in chunks on a process pool and
+written in input order as soon as each chunk is done. At most
+``workers * 2`` chunks are in flight at once, so memory stays flat no
+matter how large the input is.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import emotion_detection
+
+RESULT_FIELDS = ('emotion', 'stress_score', 'stress_level')
+
+
+def read_records(stream, fmt):
+    """Yield one dict per input record, without reading ahead.
+
+    A JSONL line that isn't a JSON object becomes an ``{"error": ...}``
+    record, so one bad line doesn't stop the run.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield {'error': f"line {number}: invalid JSON: {e}"}
+            continue
+        if not isinstance(record, dict):
+            yield {'error': f"line {number}: expected a JSON object, got {type(record).__name__}"}
+            continue
+        yield record
+
+
+def chunked(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def classify_chunk(records, text_field, age_field, default_age, engine):
+    """Classify one chunk of records, adding the result fields to each; runs in a worker"""
+    messages = []
+    ages = []
+    valid = []
+    for record in records:
+        if 'error' in record and text_field not in record:
+            continue  # unreadable input line, passed through as is
+        message = record.get(text_field)
+        if isinstance(message, str) and message.strip():
+            try:
+                age = int(record.get(age_field) or default_age)
+            except (TypeError, ValueError):
+                age = default_age
+            messages.append(message)
+            ages.append(age)
+            valid.append(record)
+        else:
+            record['error'] = f"missing {text_field!r}"
+    for record, result in zip(valid, emotion_detection.detect_emotions_batch(messages, ages, engine)):
+        for field in RESULT_FIELDS:
+            record[field] = getattr(result, field)
+    return records
+
+
+class RecordWriter:
+    """Write classified records as JSONL, or as CSV with the header taken from the first record"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+
+    def write(self, records):
+        if self.fmt == 'jsonl':
+            self.stream.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        else:
+            if self._csv is None:
+                # Take the header from a readable record, not an unreadable line's error
+                first = next((record for record in records if set(record) != {'error'}), records[0])
+                fields = list(first) + [field for field in RESULT_FIELDS + ('error',) if field not in first]
+                self._csv = csv.DictWriter(self.stream, fieldnames=fields, extrasaction='ignore')
+                self._csv.writeheader()
+            self._csv.writerows(records)
+        self.stream.flush()
+
+
+def _format_for(path, override):
+    if override:
+        return override
+    return 'csv' if path and path.lower().endswith('.csv') else 'jsonl'
+
+
+def run(records, writer, workers, chunk_size, classify_args, progress_every=100000):
+    """Classify ``records`` and write them in order; returns the number of records written"""
+    written = 0
+    next_report = progress_every
+    started = time.perf_counter()
+
+    def report():
+        elapsed = time.perf_counter() - started
+        print(f"📊 {written} records, {written / elapsed:.0f}/s", file=sys.stderr)
+
+    if workers <= 0:
+        for chunk in chunked(records, chunk_size):
+            writer.write(classify_chunk(chunk, *classify_args))
+            written += len(chunk)
+            if written >= next_report:
+                report()
+                next_report += progress_every
+        return written
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunked(records, chunk_size):
+            pending.append(pool.submit(classify_chunk, chunk, *classify_args))
+            # Bound the chunks in flight; the oldest must finish first to keep output in order
+            while len(pending) >= workers * 2:
+                done = pending.popleft().result()
+                writer.write(done)
+                written += len(done)
+            if written >= next_report:
+                report()
+                next_report += progress_every
+        while pending:
+            done = pending.popleft().result()
+            writer.write(done)
+            written += len(done)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a JSONL or CSV message corpus")
+    parser.add_argument('input', help="input file, or - for stdin")
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    parser.add_argument('--input-format', choices=('jsonl', 'csv'), help="default: from the file extension")
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'), help="default: from the output extension")
+    parser.add_argument('--text-field', default='message', help="field holding the message text")
+    parser.add_argument('--age-field', default='age', help="field holding the sender's age")
+    parser.add_argument('--age', type=int, default=20, help="age used when a record has none")
+    parser.add_argument('--engine', choices=sorted(emotion_detection.ENGINES),
+                        help="detection engine (default: the configured engine)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 classifies in this process")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="records per worker task")
+    args = parser.parse_args(argv)
+
+    input_format = _format_for(None if args.input == '-' else args.input, args.input_format)
+    output_format = _format_for(args.output, args.output_format)
+    if args.input == '-':
+        source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    else:
+        source = open(args.input, encoding='utf-8', newline='')
+    target = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+
+    started = time.perf_counter()
+    try:
+        written = run(read_records(source, input_format), RecordWriter(target, output_format),
+                      args.workers, args.chunk_size,
+                      (args.text_field, args.age_field, args.age, args.engine))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    elapsed = time.perf_counter() - started
+    print(f"✅ Classified {written} records in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
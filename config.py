@@ -3,4 +3,17 @@ import os
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///users.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite pragmas applied to every new connection (see database.configure_sqlite).
+    # WAL lets readers keep reading while a writer commits.
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    # How long a writer waits for the lock before "database is locked"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # NORMAL is durable under WAL except for the last commits on power loss
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    # Negative values are KiB: 20 MB of page cache per connection
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -20000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))
+    # INCREMENTAL lets maintenance hand free pages back in small slices
+    SQLITE_AUTO_VACUUM = os.environ.get('SQLITE_AUTO_VACUUM', 'INCREMENTAL')
@@ -0,0 +1,88 @@
+import sys
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+# One recent exchange: what the user said and what was detected
+Turn = namedtuple('Turn', ['message', 'emotion', 'stress_score', 'at'])
+
+# Longer messages are cut down before being kept; context only needs the gist
+MAX_TURN_MESSAGE_LENGTH = 500
+# Rough fixed cost of a Turn, its deque slot and the floats inside it
+_TURN_OVERHEAD = 200
+
+
+def _turn_size(turn):
+    return _TURN_OVERHEAD + sys.getsizeof(turn.message) + sys.getsizeof(turn.emotion)
+
+
+class ConversationContext:
+    """Bounded, thread-safe in-process memory of each user's recent turns.
+
+    Every user gets a ring buffer of their last ``turns`` turns. Users are
+    kept in least-recently-used order; once more than ``max_users`` users
+    are tracked, or the estimated size passes ``max_bytes``, the least
+    recently active users are forgotten. Nothing here touches the database,
+    so a forgotten user simply starts without context.
+    """
+
+    def __init__(self, max_users=10000, turns=5, max_bytes=8 * 1024 * 1024):
+        self.max_users = max_users
+        self.turns = turns
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._users = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, user_id, message, emotion, stress_score, at=None):
+        """Append a turn to ``user_id``'s buffer, evicting old turns and idle users as needed"""
+        if self.turns <= 0 or self.max_users <= 0:
+            return
+        turn = Turn(message[:MAX_TURN_MESSAGE_LENGTH], emotion, stress_score,
+                    time.time() if at is None else at)
+        size = _turn_size(turn)
+        with self._lock:
+            buffer = self._users.get(user_id)
+            if buffer is None:
+                buffer = self._users[user_id] = deque(maxlen=self.turns)
+                self._sizes[user_id] = 0
+            else:
+                self._users.move_to_end(user_id)
+            if len(buffer) == buffer.maxlen:
+                dropped = _turn_size(buffer[0])
+                self._sizes[user_id] -= dropped
+                self._bytes -= dropped
+            buffer.append(turn)
+            self._sizes[user_id] += size
+            self._bytes += size
+
+            while self._users and (len(self._users) > self.max_users or self._bytes > self.max_bytes):
+                evicted, _ = self._users.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+
+    def recent(self, user_id):
+        """Return ``user_id``'s recent turns, oldest first, as a tuple"""
+        with self._lock:
+            buffer = self._users.get(user_id)
+            if buffer is None:
+                return ()
+            self._users.move_to_end(user_id)
+            return tuple(buffer)
+
+    def forget(self, user_id):
+        with self._lock:
+            if self._users.pop(user_id, None) is not None:
+                self._bytes -= self._sizes.pop(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'max_users': self.max_users,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
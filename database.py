@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+# ======================================================================
+# SQLITE CONNECTION SETUP
+# ======================================================================
+# Every new connection in the pool gets the same pragmas, so each gunicorn
+# worker (and each thread's connection) runs in the same mode.
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+AUTO_VACUUM_MODES = ('NONE', 'FULL', 'INCREMENTAL')
+
+
+def sqlite_pragmas(config):
+    """Build the PRAGMA statements for a connection from the SQLITE_* config keys"""
+    auto_vacuum = str(config['SQLITE_AUTO_VACUUM']).upper()
+    journal_mode = str(config['SQLITE_JOURNAL_MODE']).upper()
+    synchronous = str(config['SQLITE_SYNCHRONOUS']).upper()
+    if auto_vacuum not in AUTO_VACUUM_MODES:
+        raise ValueError(f"SQLITE_AUTO_VACUUM must be one of {AUTO_VACUUM_MODES}")
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f"SQLITE_JOURNAL_MODE must be one of {JOURNAL_MODES}")
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"SQLITE_SYNCHRONOUS must be one of {SYNCHRONOUS_LEVELS}")
+    return [
+        # Only takes effect on a new database file; see enable_incremental_vacuum for existing ones
+        f"PRAGMA auto_vacuum={auto_vacuum}",
+        f"PRAGMA journal_mode={journal_mode}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA synchronous={synchronous}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+
+def configure_sqlite(engine, config):
+    """Apply the configured pragmas to every new connection of ``engine``; no-op for other databases"""
+    if engine.dialect.name != 'sqlite':
+        return
+    statements = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+# ======================================================================
+# CONCURRENCY CHECK - do readers wait while a writer holds the lock?
+# ======================================================================
+
+def _timed_reads(path, statements, reads, waits, start):
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    for statement in statements:
+        connection.execute(statement)
+    start.wait()
+    for _ in range(reads):
+        started = time.perf_counter()
+        connection.execute("SELECT count(*) FROM message").fetchone()
+        waits.append(time.perf_counter() - started)
+        time.sleep(0.005)
+    connection.close()
+
+
+def measure_reader_waits(statements, hold=0.5, readers=4, reads=20):
+    """Time reads on a scratch database while another connection holds an exclusive write.
+
+    Returns the reader waits in seconds. Uses its own temporary file, never
+    the application's database.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'concurrency.db')
+        writer = sqlite3.connect(path, timeout=30, isolation_level=None)
+        for statement in statements:
+            writer.execute(statement)
+        writer.execute("CREATE TABLE message (id INTEGER PRIMARY KEY, body TEXT)")
+        writer.executemany("INSERT INTO message (body) VALUES (?)", [('hello',)] * 1000)
+
+        waits = []
+        start = threading.Event()
+        threads = [threading.Thread(target=_timed_reads, args=(path, statements, reads, waits, start))
+                   for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        # An exclusive write, as a commit takes, held for ``hold`` seconds
+        writer.execute("BEGIN EXCLUSIVE")
+        writer.execute("INSERT INTO message (body) VALUES ('new')")
+        start.set()
+        time.sleep(hold)
+        writer.execute("COMMIT")
+        for thread in threads:
+            thread.join()
+        writer.close()
+        return waits
+
+
+# ======================================================================
+# MAINTENANCE - statistics, incremental vacuum, WAL checkpoint
+# ======================================================================
+# Every step is cheap on its own and the vacuum runs in slices until the
+# time budget is spent, so a run never holds the write lock for long.
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+def database_stats(connection):
+    """File size (database plus WAL), page counts and vacuum mode of an open sqlite3 connection"""
+    path = next(row[2] for row in connection.execute("PRAGMA database_list") if row[1] == 'main')
+    file_bytes = 0
+    for name in (path, path + '-wal'):
+        if name and os.path.exists(name):
+            file_bytes += os.path.getsize(name)
+    return {
+        'file_bytes': file_bytes,
+        'page_size': connection.execute("PRAGMA page_size").fetchone()[0],
+        'page_count': connection.execute("PRAGMA page_count").fetchone()[0],
+        'freelist_count': connection.execute("PRAGMA freelist_count").fetchone()[0],
+        'auto_vacuum': AUTO_VACUUM_MODES[connection.execute("PRAGMA auto_vacuum").fetchone()[0]],
+    }
+
+
+def run_maintenance(connection, budget=1.0, vacuum_step=256, checkpoint='PASSIVE', analysis_limit=400):
+    """One maintenance run on a sqlite3 connection, outside any transaction.
+
+    Refreshes planner statistics, returns free pages to the filesystem in
+    ``vacuum_step``-page slices until ``budget`` seconds have passed, then
+    checkpoints the WAL. Returns a report of what was done.
+    """
+    checkpoint = checkpoint.upper()
+    if checkpoint not in CHECKPOINT_MODES:
+        raise ValueError(f"checkpoint must be one of {CHECKPOINT_MODES}")
+    started = time.perf_counter()
+    deadline = started + budget
+    before = database_stats(connection)
+
+    # analysis_limit makes ANALYZE sample each index instead of reading it all
+    connection.execute(f"PRAGMA analysis_limit={int(analysis_limit)}")
+    connection.execute("ANALYZE")
+
+    vacuumed = 0
+    if before['auto_vacuum'] == 'INCREMENTAL':
+        free = before['freelist_count']
+        # At least one slice per run, so a tight budget still makes progress
+        while free:
+            # executescript steps the pragma to completion; execute() frees a single page
+            connection.executescript(f"PRAGMA incremental_vacuum({min(vacuum_step, free)})")
+            remaining = connection.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break
+            vacuumed += free - remaining
+            free = remaining
+            if time.perf_counter() >= deadline:
+                break
+
+    busy, wal_frames, checkpointed = connection.execute(f"PRAGMA wal_checkpoint({checkpoint})").fetchone()
+    return {
+        'before': before,
+        'after': database_stats(connection),
+        'vacuumed_pages': vacuumed,
+        'checkpoint': {'mode': checkpoint, 'busy': bool(busy),
+                       'wal_frames': wal_frames, 'checkpointed': checkpointed},
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def enable_incremental_vacuum(connection):
+    """Switch an existing database to auto_vacuum=INCREMENTAL; rewrites the whole file once"""
+    connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    connection.executescript("VACUUM")
+    return database_stats(connection)
@@ -0,0 +1,84 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+MODES = ('inline', 'thread', 'process')
+
+
+class DetectorBusy(Exception):
+    """Raised when every worker and queue slot is taken"""
+
+
+class DetectorTimeout(Exception):
+    """Raised when a detection call does not finish within its timeout"""
+
+
+class DetectionExecutor:
+    """Bounded execution layer for emotion detection.
+
+    ``mode`` is one of:
+      inline  - run in the calling request thread
+      thread  - run on a pool of ``workers`` threads
+      process - run on a pool of ``workers`` processes
+
+    At most ``workers + queue_size`` calls may be running or waiting at once;
+    beyond that ``run`` fails fast with ``DetectorBusy`` instead of queueing.
+    In pool modes a call that takes longer than ``timeout`` seconds raises
+    ``DetectorTimeout``. Its slot stays taken until the work really ends, so
+    slow calls keep pushing back on new ones. ``initializer`` runs once in
+    every worker process.
+    """
+
+    def __init__(self, mode='inline', workers=2, queue_size=8, timeout=5.0, initializer=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown detection mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.initializer = initializer
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # Pools are created on first use so each forked gunicorn worker gets its own
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    if self.mode == 'thread':
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='detector')
+                    else:
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                         initializer=self.initializer)
+        return self._pool
+
+    def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` within the executor's bounds and return its result"""
+        if not self._slots.acquire(blocking=False):
+            raise DetectorBusy()
+
+        if self.mode == 'inline':
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._get_pool().submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise DetectorTimeout()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,160 @@
+import logging
+import os
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # the 'model' engine is optional; rules and scored work without NumPy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# ======================================================================
+# STATISTICAL CLASSIFIER - multinomial naive Bayes over hashed tokens
+# ======================================================================
+# Trained offline from Conversation history and saved as a compact .npz
+# artifact: one log-prior per emotion and one log-probability per
+# (emotion, feature bucket). Inference is a gather-and-sum over those
+# arrays, done for a whole batch of messages at once.
+
+MODEL_PATH = os.environ.get(
+    'SERENITY_CLASSIFIER_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'emotion_model.npz')
+)
+MODEL_VERSION = 1
+DEFAULT_FEATURES = 2 ** 15
+DEFAULT_ALPHA = 0.5
+
+
+def available():
+    """True when NumPy is installed, so models can be trained and loaded"""
+    return np is not None
+
+
+def _bucket(feature, n_features):
+    # crc32 is stable across processes, unlike the salted built-in hash()
+    return zlib.crc32(feature.encode('utf-8')) % n_features
+
+
+def featurize(tokens, n_features=DEFAULT_FEATURES):
+    """Hash a message's unigrams and bigrams into feature bucket indices.
+
+    Negated words get a ``not_`` prefix, so "not happy" and "happy" land in
+    different buckets.
+    """
+    words = [f"not_{word}" if negated else word for word, negated in zip(tokens.words, tokens.negated)]
+    features = [_bucket(word, n_features) for word in words]
+    features.extend(_bucket(f"{first} {second}", n_features) for first, second in zip(words, words[1:]))
+    return features
+
+
+class NaiveBayesModel:
+    """Multinomial naive Bayes emotion model loaded from an ``.npz`` artifact"""
+
+    def __init__(self, labels, class_log_prior, feature_log_prob):
+        self.labels = tuple(labels)
+        self.class_log_prior = class_log_prior
+        self.feature_log_prob = feature_log_prob
+        self.n_features = feature_log_prob.shape[1]
+
+    @classmethod
+    def train(cls, token_lists, labels, n_features=DEFAULT_FEATURES, alpha=DEFAULT_ALPHA):
+        """Fit a model from tokenized messages and their emotion labels"""
+        if np is None:
+            raise RuntimeError("NumPy is required to train the emotion classifier")
+        classes = sorted(set(labels))
+        if len(classes) < 2:
+            raise ValueError("Need examples of at least two emotions to train")
+        class_index = {label: index for index, label in enumerate(classes)}
+
+        counts = np.zeros((len(classes), n_features), dtype=np.float64)
+        priors = np.zeros(len(classes), dtype=np.float64)
+        for tokens, label in zip(token_lists, labels):
+            row = class_index[label]
+            priors[row] += 1
+            np.add.at(counts[row], featurize(tokens, n_features), 1)
+
+        counts += alpha
+        feature_log_prob = np.log(counts) - np.log(counts.sum(axis=1, keepdims=True))
+        class_log_prior = np.log(priors) - np.log(priors.sum())
+        return cls(classes, class_log_prior.astype(np.float32), feature_log_prob.astype(np.float32))
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        if np is None:
+            raise RuntimeError("NumPy is required to load the emotion classifier")
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != MODEL_VERSION:
+                raise ValueError(f"Unsupported classifier version {int(data['version'])}")
+            return cls([str(label) for label in data['labels']],
+                       data['class_log_prior'], data['feature_log_prob'])
+
+    def save(self, path=MODEL_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write next to the target and rename, so a running app never loads half a file
+        partial = f"{path}.partial.npz"
+        np.savez_compressed(partial, version=np.int32(MODEL_VERSION), labels=np.array(self.labels),
+                            class_log_prior=self.class_log_prior,
+                            feature_log_prob=self.feature_log_prob)
+        os.replace(partial, path)
+
+    def predict_proba(self, token_lists):
+        """Return a ``(messages, labels)`` array of posterior probabilities.
+
+        All messages are featurized into one flat index array, their
+        per-class log-likelihoods gathered in a single ``take`` and summed per
+        message with ``reduceat``. Messages without features get the prior.
+        """
+        features = [featurize(tokens, self.n_features) for tokens in token_lists]
+        lengths = np.fromiter((len(indices) for indices in features), dtype=np.int64, count=len(features))
+        log_posterior = np.tile(self.class_log_prior, (len(features), 1))
+
+        nonempty = lengths > 0
+        if nonempty.any():
+            flat = np.fromiter((index for indices in features for index in indices),
+                               dtype=np.int64, count=int(lengths.sum()))
+            offsets = np.concatenate(([0], np.cumsum(lengths[nonempty])[:-1]))
+            gathered = self.feature_log_prob.take(flat, axis=1)
+            log_posterior[nonempty] += np.add.reduceat(gathered, offsets, axis=1).T
+
+        log_posterior -= log_posterior.max(axis=1, keepdims=True)
+        probabilities = np.exp(log_posterior)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+_model = None
+_model_mtime = None
+_reload_listeners = []
+
+
+def on_model_reload(listener):
+    """Call ``listener()`` whenever a different model artifact is loaded"""
+    _reload_listeners.append(listener)
+
+
+def get_model(path=MODEL_PATH):
+    """Return the trained model, loading it on first use; ``None`` if there is none.
+
+    The artifact is reloaded when its file changes, so a retrained model is
+    picked up without a restart.
+    """
+    global _model, _model_mtime
+    if np is None:
+        return None
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if mtime != _model_mtime:
+        try:
+            _model = NaiveBayesModel.load(path)
+            logger.info(f"🧠 Loaded emotion classifier with {len(_model.labels)} emotions from {path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Emotion classifier load failed: {e}")
+            _model = None
+        _model_mtime = mtime
+        for listener in _reload_listeners:
+            listener()
+    return _model
@@ -1,1138 +1,1230 @@
+import itertools
+import json
+import logging
+import os
 import random
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from types import MappingProxyType
 
-def detect_emotion_and_respond(message, age=20):
-    """Detect emotion from message with age-based personalization and response variety"""
-    message_lower = message.lower()
-    
-    # Determine age group
+import emotion_classifier
+from tip_search import TipIndex, search_terms
+
+logger = logging.getLogger(__name__)
+
+# ======================================================================
+# LEXICON FILES
+# ======================================================================
+# Keywords, phrases and response pools live in versioned JSON files under
+# LEXICON_DIR. They are compiled into a Lexicon once at import, and again
+# by the reload watcher whenever a file changes - never on the request path.
+
+LEXICON_DIR = os.environ.get(
+    'SERENITY_LEXICON_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lexicon')
+)
+LEXICON_FILES = ('lexicon.json', 'responses.json')
+LEXICON_RELOAD_INTERVAL = float(os.environ.get('SERENITY_LEXICON_RELOAD_INTERVAL', 30))
+
+AGE_GROUPS = ('teen', 'young_adult', 'adult', 'senior')
+
+# Stage match modes:
+#   any       - fires on a match anywhere in the message
+#   leading   - fires only when the message starts with the phrase
+#   first     - the first match decides, negated or not
+#   unnegated - fires on the first match that is not negated
+STAGE_MODES = ('any', 'leading', 'first', 'unnegated')
+# Stages in these modes answer small talk rather than detect an emotion
+SMALL_TALK_MODES = ('any', 'leading')
+
+
+# ======================================================================
+# TOKENIZER - shared by every detection stage
+# ======================================================================
+
+# A token is either a word (apostrophes allowed inside) or clause punctuation
+_TOKEN_RE = re.compile(r"([^\W_]+(?:'[^\W_]+)*)|[.,;:!?…]")
+_APOSTROPHES = str.maketrans({'‘': "'", '’': "'", 'ʼ': "'", '＇': "'"})
+
+Tokens = namedtuple('Tokens', ['words', 'negated', 'intensity'])
+
+
+def tokenize(message, lexicon=None):
+    """Split ``message`` into casefolded words with per-word negation and intensity.
+
+    A word is negated when one of the ``negation_scope`` words before it in
+    the same clause is a negation word, and its intensity is the product of
+    the intensifiers in the ``intensity_scope`` words before it. Unknown
+    words close to a category keyword are replaced by it. All three lists
+    are built in one pass.
+    """
+    lexicon = lexicon or _active
+    negation_words = lexicon.negation_words
+    intensifiers = lexicon.intensifiers
+    words = []
+    negated = []
+    intensity = []
+    scope = 0
+    boost = 1.0
+    boost_scope = 0
+    for match in _TOKEN_RE.finditer(message.casefold().translate(_APOSTROPHES)):
+        word = match.group(1)
+        if word is None:
+            scope = boost_scope = 0
+            continue
+        if lexicon.fuzzy_min_length <= len(word) <= lexicon.fuzzy_max_length and word not in lexicon.vocabulary:
+            corrected = lexicon.corrections.get(word)
+            if corrected is None:
+                corrected = correct_word(word, lexicon) or word
+                if len(lexicon.corrections) < FUZZY_MEMO_SIZE:
+                    lexicon.corrections[word] = corrected
+            word = corrected
+        words.append(word)
+        negated.append(scope > 0)
+        intensity.append(boost if boost_scope else 1.0)
+        if word in negation_words or word.endswith("n't"):
+            scope = lexicon.negation_scope
+        elif scope:
+            scope -= 1
+        if word in intensifiers:
+            boost = (boost if boost_scope else 1.0) * intensifiers[word]
+            boost_scope = lexicon.intensity_scope
+        elif boost_scope:
+            boost_scope -= 1
+    return Tokens(words, negated, intensity)
+
+
+def normalize_message(message):
+    """Casefold ``message`` and collapse its whitespace, for use as a cache key"""
+    return ' '.join(message.casefold().translate(_APOSTROPHES).split())
+
+
+# ======================================================================
+# CRISIS FAST PATH - runs before every other stage
+# ======================================================================
+
+_BOUNDARY = ' '
+_OTHER_WORD_CHAR = '\0'
+
+
+def _crisis_variants(phrases):
+    """Yield ``(spelling, phrase)`` for each crisis phrase with its apostrophes
+    as word breaks, plus its spelling without them.
+
+    The scanner treats an apostrophe like any other punctuation, so quoted
+    ('kill myself') and possessive (suicide's) mentions still match.
+    """
+    for phrase in phrases:
+        yield phrase.replace("'", ' '), phrase
+        if "'" in phrase:
+            yield phrase.replace("'", ''), phrase
+
+
+def _compile_crisis_automaton(phrases):
+    """Compile crisis phrases into a word-boundary-aware Aho-Corasick DFA.
+
+    Every phrase is wrapped in boundary symbols, so it only matches as whole
+    words. Failure links are folded into a complete transition table over the
+    phrases' alphabet plus a boundary and an "any other word character"
+    symbol, so scanning costs one table lookup per input character no matter
+    how many phrases there are.
+
+    Returns ``(transitions, accepting)``: one ``{symbol: state}`` dict and
+    one matched phrase (or ``None``) per state.
+    """
+    goto = [{}]
+    accepting = [None]
+    for spelling, phrase in _crisis_variants(phrases):
+        state = 0
+        for symbol in _BOUNDARY + ' '.join(spelling.casefold().split()) + _BOUNDARY:
+            if symbol not in goto[state]:
+                goto.append({})
+                accepting.append(None)
+                goto[state][symbol] = len(goto) - 1
+            state = goto[state][symbol]
+        accepting[state] = phrase
+
+    alphabet = {symbol for edges in goto for symbol in edges} | {_OTHER_WORD_CHAR}
+    transitions = [None] * len(goto)
+    transitions[0] = {symbol: goto[0].get(symbol, 0) for symbol in alphabet}
+    failure = [0] * len(goto)
+    queue = list(goto[0].values())
+    for state in queue:
+        transitions[state] = {}
+    # Breadth-first, so a state's failure target is complete before it is used
+    for state in queue:
+        fallback = transitions[failure[state]]
+        if accepting[state] is None:
+            accepting[state] = accepting[failure[state]]
+        for symbol in alphabet:
+            target = goto[state].get(symbol)
+            if target is None:
+                transitions[state][symbol] = fallback[symbol]
+            else:
+                failure[target] = fallback[symbol]
+                transitions[target] = {}
+                queue.append(target)
+                transitions[state][symbol] = target
+    return transitions, accepting
+
+
+def find_crisis_phrase(message, lexicon=None):
+    """Return the first crisis phrase found in ``message`` as whole words, or ``None``.
+
+    Runs of punctuation and whitespace count as a single word boundary.
+    """
+    lexicon = lexicon or _active
+    transitions = lexicon.crisis_transitions
+    accepting = lexicon.crisis_accepting
+    alphabet = transitions[0]
+    state = transitions[0][_BOUNDARY]
+    at_boundary = True
+    for char in message.casefold().translate(_APOSTROPHES):
+        if char in alphabet and char != _BOUNDARY:
+            at_boundary = False
+        elif char.isalnum():
+            char = _OTHER_WORD_CHAR
+            at_boundary = False
+        elif at_boundary:
+            continue
+        else:
+            char = _BOUNDARY
+            at_boundary = True
+        state = transitions[state][char]
+        if accepting[state] is not None:
+            return accepting[state]
+    return accepting[transitions[state][_BOUNDARY]]
+
+
+# ======================================================================
+# FUZZY KEYWORDS - symmetric-delete index for misspelled category words
+# ======================================================================
+
+# Unknown words seen per lexicon whose correction is remembered; chat
+# vocabulary repeats heavily, so most lookups after warm-up are one dict hit
+FUZZY_MEMO_SIZE = int(os.environ.get('SERENITY_FUZZY_MEMO_SIZE', 8192))
+
+def _deletes(word, distance):
+    """Every string made by deleting up to ``distance`` characters from ``word``"""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {edit[:i] + edit[i + 1:] for edit in frontier for i in range(len(edit))}
+        found |= frontier
+    return found
+
+
+def _compile_fuzzy_index(keywords, distance):
+    """Map every deletion variant of ``keywords`` to the keywords it came from.
+
+    Keywords keep their given order within each entry, so earlier keywords
+    win ties.
+    """
+    index = {}
+    for keyword in keywords:
+        for variant in _deletes(keyword, distance):
+            entry = index.setdefault(variant, [])
+            if keyword not in entry:
+                entry.append(keyword)
+    return {variant: tuple(entry) for variant, entry in index.items()}
+
+
+def _edit_distance(a, b, limit):
+    """Damerau-Levenshtein (optimal string alignment) distance, or ``limit + 1`` past ``limit``"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _is_slip(word, keyword):
+    """Whether ``word`` is ``keyword`` with one letter dropped or two neighbouring letters swapped"""
+    if len(word) == len(keyword) - 1:
+        return any(keyword[:i] + keyword[i + 1:] == word for i in range(len(keyword)))
+    if len(word) != len(keyword):
+        return False
+    differ = [i for i in range(len(word)) if word[i] != keyword[i]]
+    return (len(differ) == 2 and differ[1] == differ[0] + 1
+            and word[differ[0]] == keyword[differ[1]] and word[differ[1]] == keyword[differ[0]])
+
+
+def correct_word(word, lexicon=None):
+    """Return the category keyword ``word`` is most likely a misspelling of, or ``None``.
+
+    Looks up at most ``len(word) ** distance`` deletion variants in the
+    lexicon's precomputed index, so the cost depends only on the word, not
+    on how many keywords there are. Words longer than any keyword plus the
+    edit distance can't match and are skipped. A typo must keep the
+    keyword's first letter, and words shorter than ``fuzzy_slips_below``
+    are only corrected for a dropped letter or two swapped neighbours. The
+    closest keyword wins; ties go to the higher-priority stage.
+    """
+    lexicon = lexicon or _active
+    if len(word) > lexicon.fuzzy_max_length:
+        return None
+    distance = 0
+    for min_length, max_distance in lexicon.fuzzy_distances:
+        if len(word) >= min_length:
+            distance = max_distance
+    if not distance:
+        return None
+    best = None
+    best_distance = distance + 1
+    best_rank = None
+    for variant in _deletes(word, distance):
+        for keyword in lexicon.fuzzy_index.get(variant, ()):
+            # A typo keeps the first letter, and letters added after a whole keyword
+            # other than a plural "s" make a different word (office -> officer)
+            if keyword[0] != word[0] or (word.startswith(keyword) and word[len(keyword):] != 's'):
+                continue
+            found = _edit_distance(word, keyword, distance)
+            if found > distance or (len(word) < lexicon.fuzzy_slips_below and not _is_slip(word, keyword)):
+                continue
+            rank = lexicon.fuzzy_rank[keyword]
+            if found < best_distance or (found == best_distance and rank < best_rank):
+                best, best_distance, best_rank = keyword, found, rank
+    return best
+
+
+# ======================================================================
+# STAGE TRIE - every keyword and phrase in one token trie
+# ======================================================================
+
+def _compile_trie(stages):
+    """Compile every stage's phrases into one token trie.
+
+    Each node is a ``(priorities, children)`` pair, where ``priorities`` lists
+    the stages whose phrase ends at that node and ``children`` maps the next
+    token to the next node. Single keywords live directly under the root, so
+    the root doubles as the token-to-stage map.
+    """
+    root = {}
+    for priority, (mode, phrases, pool, negated_pool) in enumerate(stages):
+        for phrase in phrases:
+            children = root
+            for token in phrase.casefold().split():
+                node = children.setdefault(token, ([], {}))
+                children = node[1]
+            if priority not in node[0]:
+                node[0].append(priority)
+    return root
+
+
+def _match_stage(tokens, lexicon):
+    """Find the highest-priority stage matching ``tokens`` in a single pass.
+
+    Returns ``(priority, negated)``, or ``None`` when no stage matches.
+    """
+    stage_modes = lexicon.stage_modes
+    best = len(stage_modes)
+    best_negated = False
+    words, negations, intensity = tokens
+    count = len(words)
+
+    for start in range(count):
+        children = lexicon.trie
+        end = start
+        while end < count:
+            node = children.get(words[end])
+            if node is None:
+                break
+            for priority in node[0]:
+                if priority >= best:
+                    continue
+                mode = stage_modes[priority]
+                if mode == 'leading' and start != 0:
+                    continue
+                negated = mode != 'any' and mode != 'leading' and negations[start]
+                if negated and mode == 'unnegated':
+                    continue
+                best, best_negated = priority, negated
+            children = node[1]
+            end += 1
+        if best == 0:
+            break
+
+    if best == len(stage_modes):
+        return None
+    return best, best_negated
+
+
+# ======================================================================
+# RESPONSE TABLE
+# ======================================================================
+
+class DetectionResult:
+    """Immutable detection result with its JSON body serialized up front.
+
+    Supports ``result['emotion']`` style access so callers written against
+    the old dict results keep working.
+    """
+
+    __slots__ = ('emotion', 'stress_score', 'stress_level', 'stress_icon',
+                 'caring_response', 'tips', 'scores', '_body')
+
+    FIELDS = ('emotion', 'stress_score', 'stress_level', 'stress_icon', 'caring_response', 'tips')
+
+    def __init__(self, emotion, stress_score, stress_level, stress_icon, caring_response, tips, scores=()):
+        set_field = object.__setattr__
+        set_field(self, 'emotion', emotion)
+        set_field(self, 'stress_score', stress_score)
+        set_field(self, 'stress_level', stress_level)
+        set_field(self, 'stress_icon', stress_icon)
+        set_field(self, 'caring_response', caring_response)
+        set_field(self, 'tips', tuple(tips))
+        set_field(self, 'scores', scores)
+        set_field(self, '_body', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DetectionResult is immutable")
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __reduce__(self):
+        # Rebuild through __init__ so results can cross process boundaries
+        return (DetectionResult, tuple(getattr(self, field) for field in self.FIELDS) + (self.scores,))
+
+    def __repr__(self):
+        return f"DetectionResult(emotion={self.emotion!r}, stress_score={self.stress_score!r})"
+
+    def rescored(self, stress_score, scores=()):
+        """Copy of this result with a new stress score and emotion distribution"""
+        if self.stress_level == 'CRITICAL':
+            return self
+        stress_level, stress_icon = stress_level_for(stress_score)
+        return DetectionResult(self.emotion, stress_score, stress_level, stress_icon,
+                               self.caring_response, self.tips, scores)
+
+    def with_tips(self, tips):
+        """Copy of this result with its tips replaced, e.g. reordered"""
+        return DetectionResult(self.emotion, self.stress_score, self.stress_level, self.stress_icon,
+                               self.caring_response, tips, self.scores)
+
+    def to_dict(self):
+        """Return the result as the dict served by ``/api/detect``"""
+        result = {field: getattr(self, field) for field in self.FIELDS}
+        result['tips'] = list(self.tips)
+        return result
+
+    @property
+    def body(self):
+        """JSON body for ``/api/detect``, encoded on first use and reused"""
+        if self._body is None:
+            body = json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':'))
+            object.__setattr__(self, '_body', body.encode('utf-8'))
+        return self._body
+
+
+def stress_level_for(stress_score):
+    """Map a 0-10 stress score to its (stress_level, stress_icon) pair"""
+    if stress_score >= 7:
+        return 'High', '🔴'
+    elif stress_score >= 4:
+        return 'Medium', '🟡'
+    return 'Low', '🟢'
+
+
+def _build_response_table(pools):
+    """Build every (pool, age_group, variant) result once, bodies included.
+
+    A variant is either ``{"msg": ..., "tips": [...]}`` or a plain message
+    that uses the pool's shared ``tips``. A pool's ``message_prefix`` is put
+    in front of every message.
+    """
+    table = {}
+    for pool, spec in pools.items():
+        prefix = spec.get('message_prefix', '')
+        for age_group in AGE_GROUPS:
+            variants = spec['variants'][age_group]
+            if not variants:
+                raise ValueError(f"Response pool {pool!r} has no variants for {age_group!r}")
+            for variant, selected in enumerate(variants):
+                if isinstance(selected, str):
+                    selected = {"msg": selected}
+                result = DetectionResult(spec['emotion'], spec['stress_score'], spec['stress_level'],
+                                         spec['stress_icon'], prefix + selected["msg"],
+                                         selected.get("tips", spec.get('tips', ())))
+                result.body  # serialize now so requests never re-encode
+                table[(pool, age_group, variant)] = result
+    return MappingProxyType(table)
+
+
+def _group_variants(table):
+    grouped = {}
+    for (pool, age_group, variant), result in sorted(table.items()):
+        grouped.setdefault((pool, age_group), []).append(result)
+    return MappingProxyType({key: tuple(results) for key, results in grouped.items()})
+
+
+# ======================================================================
+# COMPILED LEXICON - swapped atomically on reload
+# ======================================================================
+
+_revisions = itertools.count(1)
+
+
+class Lexicon:
+    """Everything compiled from one version of the lexicon and response files.
+
+    A Lexicon is never modified after it is built, apart from its memo of
+    spelling corrections. Reloading builds a new one
+    and swaps the module's reference, so a request that already holds the old
+    one finishes with it.
+    """
+
+    def __init__(self, lexicon_data, response_data, directory=None, mtimes=None):
+        self.version = (lexicon_data['version'], response_data['version'])
+        self.revision = next(_revisions)
+        self.directory = directory
+        self.mtimes = mtimes
+
+        self.crisis_phrases = tuple(lexicon_data['crisis_phrases'])
+        self.crisis_transitions, self.crisis_accepting = _compile_crisis_automaton(self.crisis_phrases)
+        self.negation_words = frozenset(lexicon_data['negation_words'])
+        self.negation_scope = lexicon_data['negation_scope']
+        self.intensifiers = MappingProxyType(dict(lexicon_data['intensifiers']))
+        self.intensity_scope = lexicon_data['intensity_scope']
+
+        pools = response_data['pools']
+        for pool in ('crisis', 'default'):
+            if pool not in pools:
+                raise ValueError(f"Response pool {pool!r} is required")
+        stages = []
+        for stage in lexicon_data['stages']:
+            if stage['mode'] not in STAGE_MODES:
+                raise ValueError(f"Unknown stage mode {stage['mode']!r}")
+            for pool in (stage['pool'], stage.get('negated_pool')):
+                if pool is not None and pool not in pools:
+                    raise ValueError(f"Stage refers to unknown response pool {pool!r}")
+            stages.append((stage['mode'], tuple(stage['phrases']), stage['pool'], stage.get('negated_pool')))
+        self.stages = tuple(stages)
+        self.stage_modes = tuple(stage[0] for stage in self.stages)
+        self.trie = _compile_trie(self.stages)
+
+        # Misspellings are corrected towards emotion category keywords only;
+        # words the lexicon already knows are never corrected
+        self.fuzzy_distances = tuple(sorted(tuple(pair) for pair in lexicon_data.get('fuzzy_distances', ())))
+        self.fuzzy_min_length = self.fuzzy_distances[0][0] if self.fuzzy_distances else float('inf')
+        # Other single edits of short words mostly land on real words (text -> test, word -> work)
+        self.fuzzy_slips_below = lexicon_data.get('fuzzy_slips_below', 0)
+        keywords = list(dict.fromkeys(
+            token for mode, phrases, pool, negated_pool in self.stages if mode not in SMALL_TALK_MODES
+            for phrase in phrases for token in phrase.casefold().split()
+        ))
+        self.fuzzy_rank = MappingProxyType({keyword: rank for rank, keyword in enumerate(keywords)})
+        max_distance = max((distance for length, distance in self.fuzzy_distances), default=0)
+        self.fuzzy_index = MappingProxyType(_compile_fuzzy_index(keywords, max_distance))
+        # Longer words can't be within reach of any keyword; skipping them keeps cost linear in message length
+        self.fuzzy_max_length = max(map(len, keywords), default=0) + max_distance
+        # Short replies that continue the previous turn's topic ("yes", "still bad")
+        follow_up = lexicon_data.get('follow_up', {})
+        self.follow_up_words = frozenset(follow_up.get('words', ()))
+        self.follow_up_max_words = follow_up.get('max_words', 0)
+        self.follow_up_max_age = follow_up.get('max_age_seconds', 0)
+
+        # Memo of correct_word() results, filled by tokenize(); never holds more than FUZZY_MEMO_SIZE
+        self.corrections = {}
+        self.vocabulary = frozenset(
+            token for stage in self.stages for phrase in stage[1] for token in phrase.casefold().split()
+        ) | self.negation_words | frozenset(self.intensifiers) | frozenset(lexicon_data.get('fuzzy_ignore', ()))
+        # Earliest stage priority of every pool, used to break score ties
+        pool_order = {}
+        for priority, stage in enumerate(self.stages):
+            for pool in stage[2:]:
+                if pool:
+                    pool_order.setdefault(pool, priority)
+        pool_order.setdefault('default', len(self.stages))
+        self.pool_order = MappingProxyType(pool_order)
+
+        # pool -> (emotion, stress_score, stress_level, stress_icon)
+        self.response_pools = MappingProxyType({
+            pool: (spec['emotion'], spec['stress_score'], spec['stress_level'], spec['stress_icon'])
+            for pool, spec in pools.items()
+        })
+        self.response_table = _build_response_table(pools)
+        self.variants = _group_variants(self.response_table)
+        self.tip_index = TipIndex(
+            (tip, result.emotion, age_group)
+            for (pool, age_group, variant), result in self.response_table.items()
+            for tip in result.tips
+        )
+
+        # emotion -> pool that answers it, preferring a stage's own pool over
+        # pools only used for negated matches
+        emotion_pools = {}
+        for pool in [stage[2] for stage in self.stages] + list(pools):
+            emotion_pools.setdefault(self.response_pools[pool][0], pool)
+        self.emotion_pools = MappingProxyType(emotion_pools)
+        # Crisis and small talk stay with the rules; the classifier learns the rest
+        rule_pools = {'crisis'} | {stage[2] for stage in self.stages if stage[0] in SMALL_TALK_MODES}
+        self.model_emotions = frozenset(
+            emotion for emotion, pool in emotion_pools.items() if pool not in rule_pools
+        )
+
+
+def _lexicon_mtimes(directory):
+    return tuple(os.stat(os.path.join(directory, name)).st_mtime_ns for name in LEXICON_FILES)
+
+
+def load_lexicon(directory=None):
+    """Read and compile the lexicon and response files in ``directory``"""
+    directory = directory or LEXICON_DIR
+    # Stat before reading: a write that lands mid-read shows up as a newer
+    # mtime on the next check and triggers another reload
+    mtimes = _lexicon_mtimes(directory)
+    data = []
+    for name in LEXICON_FILES:
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            data.append(json.load(f))
+    return Lexicon(data[0], data[1], directory, mtimes)
+
+
+_active = load_lexicon()
+_reload_lock = threading.Lock()
+_rejected_mtimes = None
+_watcher = None
+
+
+def current_lexicon():
+    """Return the compiled lexicon currently used for detection"""
+    return _active
+
+
+def reload_lexicon(force=False):
+    """Recompile the lexicon files and swap them in if they changed.
+
+    Returns True when a new lexicon was swapped in. Files that fail to load
+    or compile are logged once and the current lexicon stays active until
+    they change again.
+    """
+    global _active, _rejected_mtimes
+    with _reload_lock:
+        directory = _active.directory
+        mtimes = None
+        try:
+            mtimes = _lexicon_mtimes(directory)
+            if not force and mtimes in (_active.mtimes, _rejected_mtimes):
+                return False
+            lexicon = load_lexicon(directory)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            _rejected_mtimes = mtimes
+            logger.error(f"Lexicon reload failed, keeping version {_active.version}: {e}")
+            return False
+        _active = lexicon
+        _cache.clear()
+        _search_tip_ids.cache_clear()
+        logger.info(f"Lexicon version {lexicon.version} loaded from {directory}")
+        return True
+
+
+def start_lexicon_watcher(interval=None):
+    """Start a daemon thread that reloads the lexicon whenever its files change"""
+    global _watcher
+    interval = LEXICON_RELOAD_INTERVAL if interval is None else interval
+    if interval <= 0 or (_watcher is not None and _watcher.is_alive()):
+        return _watcher
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                reload_lexicon()
+            except Exception as e:
+                logger.error(f"Lexicon watcher error: {e}")
+
+    _watcher = threading.Thread(target=watch, name='lexicon-watcher', daemon=True)
+    _watcher.start()
+    return _watcher
+
+
+# ======================================================================
+# DETECTION ENGINES
+# ======================================================================
+
+# pool: response pool to answer from
+# stress_score: continuous stress score, or None to keep the pool's own score
+# scores: ranked ((emotion, share), ...) distribution, empty for the rules engine
+Classification = namedtuple('Classification', ['pool', 'stress_score', 'scores'])
+
+
+def _rules_classification(match, lexicon):
+    if match is None:
+        return Classification('default', None, ())
+    priority, negated = match
+    mode, phrases, pool, negated_pool = lexicon.stages[priority]
+    return Classification(negated_pool if negated else pool, None, ())
+
+
+def _classify_rules(tokens, lexicon):
+    """Rules engine: the first matching stage in priority order wins"""
+    return _rules_classification(_match_stage(tokens, lexicon), lexicon)
+
+
+# Share of a keyword's weight taken off its category when the keyword is
+# negated and the stage has no pool of its own for negated matches
+NEGATED_WEIGHT = 0.5
+# How much the average intensifier boost of a message raises its stress score
+INTENSITY_STRESS_GAIN = 0.25
+
+
+def _score_stages(tokens, lexicon):
+    """Score every emotion category of ``tokens`` in a single pass.
+
+    Returns ``(small_talk, weights, boost)``: the highest-priority small-talk
+    stage that matched (or ``None``), the accumulated keyword weight per
+    response pool and the average intensifier boost over all category hits.
+    """
+    stages = lexicon.stages
+    words, negations, intensity = tokens
+    count = len(words)
+    small_talk = len(stages)
+    weights = {}
+    hits = 0
+    boost = 0.0
+
+    for start in range(count):
+        children = lexicon.trie
+        end = start
+        while end < count:
+            node = children.get(words[end])
+            if node is None:
+                break
+            for priority in node[0]:
+                mode, phrases, pool, negated_pool = stages[priority]
+                if mode == 'any' or mode == 'leading':
+                    if priority < small_talk and (mode == 'any' or start == 0):
+                        small_talk = priority
+                    continue
+                weight = intensity[start]
+                hits += 1
+                boost += weight
+                if negations[start]:
+                    if negated_pool is None or negated_pool == 'default':
+                        weight = -NEGATED_WEIGHT * weight
+                    else:
+                        pool = negated_pool
+                weights[pool] = weights.get(pool, 0.0) + weight
+            children = node[1]
+            end += 1
+
+    if small_talk == len(stages):
+        small_talk = None
+    return small_talk, weights, boost / hits if hits else 1.0
+
+
+def _classify_scored(tokens, lexicon):
+    """Multi-label engine: rank every category and blend a continuous stress score"""
+    small_talk, weights, boost = _score_stages(tokens, lexicon)
+    weights = {pool: weight for pool, weight in weights.items() if weight > 0}
+    if not weights:
+        pool = lexicon.stages[small_talk][2] if small_talk is not None else 'default'
+        return Classification(pool, None, ())
+
+    total = sum(weights.values())
+    ranked = sorted(weights.items(), key=lambda item: (-item[1], lexicon.pool_order[item[0]]))
+    distribution = {}
+    stress = 0.0
+    for pool, weight in ranked:
+        emotion, pool_stress = lexicon.response_pools[pool][:2]
+        distribution[emotion] = distribution.get(emotion, 0.0) + weight / total
+        stress += pool_stress * weight / total
+
+    stress = min(10.0, stress * (1 + INTENSITY_STRESS_GAIN * (boost - 1)))
+    scores = tuple(sorted(((emotion, round(share, 3)) for emotion, share in distribution.items()),
+                          key=lambda item: -item[1]))
+    return Classification(ranked[0][0], round(stress, 1), scores)
+
+
+# Below this posterior the model defers to the rules
+MODEL_MIN_CONFIDENCE = 0.4
+# Emotions below this share are left out of a model classification's scores
+MODEL_MIN_SHARE = 0.05
+
+
+def _classify_model_batch(token_lists, lexicon):
+    """Model engine for many messages: one matrix pass over everything the rules don't keep.
+
+    Small talk is answered by the rules, as is everything when no trained
+    model is available. A low-confidence prediction gives way to the rules.
+    """
+    model = emotion_classifier.get_model()
+    matches = [_match_stage(tokens, lexicon) for tokens in token_lists]
+    results = [_rules_classification(match, lexicon) for match in matches]
+    if model is None:
+        return results
+    pending = [index for index, match in enumerate(matches)
+               if match is None or lexicon.stage_modes[match[0]] not in SMALL_TALK_MODES]
+    if not pending:
+        return results
+
+    # Labels the current lexicon no longer knows are ignored
+    known = [(column, lexicon.emotion_pools[label]) for column, label in enumerate(model.labels)
+             if label in lexicon.emotion_pools]
+    probabilities = model.predict_proba([token_lists[index] for index in pending])
+    for index, row in zip(pending, probabilities):
+        ranked = sorted(((row[column], pool) for column, pool in known), reverse=True)
+        total = sum(probability for probability, pool in ranked)
+        if not ranked or total <= 0:
+            continue
+        if ranked[0][0] / total < MODEL_MIN_CONFIDENCE:
+            continue
+        stress = sum(probability * lexicon.response_pools[pool][1] for probability, pool in ranked) / total
+        scores = tuple((lexicon.response_pools[pool][0], round(float(probability / total), 3))
+                       for probability, pool in ranked if probability / total >= MODEL_MIN_SHARE)
+        results[index] = Classification(ranked[0][1], round(float(stress), 1), scores)
+    return results
+
+
+def _classify_model(tokens, lexicon):
+    """Model engine: naive Bayes over hashed tokens, with rules for crisis and small talk"""
+    return _classify_model_batch([tokens], lexicon)[0]
+
+
+def train_classifier(messages, emotions, path=None, n_features=None, alpha=None):
+    """Train the model engine from past messages and their detected emotions and save it.
+
+    Crisis, small-talk and unknown emotions are skipped. Returns the trained
+    model and the number of examples it was trained on.
+    """
+    lexicon = _active
+    token_lists = []
+    labels = []
+    for message, emotion in zip(messages, emotions):
+        if emotion in lexicon.model_emotions and message:
+            token_lists.append(tokenize(message, lexicon))
+            labels.append(emotion)
+    model = emotion_classifier.NaiveBayesModel.train(
+        token_lists, labels,
+        n_features=n_features or emotion_classifier.DEFAULT_FEATURES,
+        alpha=emotion_classifier.DEFAULT_ALPHA if alpha is None else alpha
+    )
+    model.save(path or emotion_classifier.MODEL_PATH)
+    return model, len(labels)
+
+
+def get_age_group(age):
+    """Map an age to the age group used to pick responses"""
     if age < 18:
-        age_group = "teen"
+        return "teen"
     elif age < 30:
-        age_group = "young_adult"
+        return "young_adult"
     elif age < 50:
-        age_group = "adult"
+        return "adult"
+    return "senior"
+
+
+ENGINES = {
+    'rules': _classify_rules,
+    'scored': _classify_scored,
+    'model': _classify_model,
+}
+# Engines that classify a whole list of messages in one pass
+BATCH_ENGINES = {
+    'model': _classify_model_batch,
+}
+DEFAULT_ENGINE = os.environ.get('SERENITY_DETECTION_ENGINE', 'rules')
+if DEFAULT_ENGINE == 'model' and not emotion_classifier.available():
+    logger.warning("SERENITY_DETECTION_ENGINE=model but NumPy is not installed; the rules engine answers instead")
+
+
+# ======================================================================
+# CLASSIFICATION CACHE - short, repeated messages skip the engines
+# ======================================================================
+
+# Longer messages rarely repeat, so they are classified without caching
+CACHE_MAX_MESSAGE_LENGTH = 200
+
+
+class ClassificationCache:
+    """Thread-safe LRU of classifications keyed by (lexicon revision, engine, normalized message).
+
+    Only the classification is cached; responses are still picked at random
+    per call. Age does not affect classification, so it is not part of the key.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            classification = self._entries.get(key)
+            if classification is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return classification
+
+    def put(self, key, classification):
+        with self._lock:
+            self._entries[key] = classification
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_cache = ClassificationCache(int(os.environ.get('SERENITY_CLASSIFICATION_CACHE_SIZE', 4096)))
+
+
+# Cached 'model' classifications are stale once a retrained model loads
+emotion_classifier.on_model_reload(_cache.clear)
+
+
+def configure_cache(maxsize):
+    """Change the classification cache size; 0 disables caching"""
+    _cache.resize(maxsize)
+
+
+def cache_stats():
+    """Return the cache size, limit and hit/miss/eviction counters"""
+    return _cache.stats()
+
+
+# ======================================================================
+# DETECTION API
+# ======================================================================
+
+_CRISIS = Classification('crisis', None, ())
+
+
+def classify(message, engine=None, lexicon=None):
+    """Classify ``message`` with the named engine (``DEFAULT_ENGINE`` if omitted)"""
+    lexicon = lexicon or _active
+    if find_crisis_phrase(message, lexicon) is not None:
+        return _CRISIS
+
+    engine = engine or DEFAULT_ENGINE
+    if _cache.maxsize <= 0 or len(message) > CACHE_MAX_MESSAGE_LENGTH:
+        return ENGINES[engine](tokenize(message, lexicon), lexicon)
+
+    key = (lexicon.revision, engine, normalize_message(message))
+    classification = _cache.get(key)
+    if classification is None:
+        classification = ENGINES[engine](tokenize(key[2], lexicon), lexicon)
+        _cache.put(key, classification)
+    return classification
+
+
+def classify_batch(messages, engine=None, lexicon=None):
+    """Classify many messages, running batch-capable engines once over every cache miss"""
+    lexicon = lexicon or _active
+    engine = engine or DEFAULT_ENGINE
+    results = [None] * len(messages)
+    missed = []
+    for index, message in enumerate(messages):
+        if find_crisis_phrase(message, lexicon) is not None:
+            results[index] = _CRISIS
+        elif _cache.maxsize > 0 and len(message) <= CACHE_MAX_MESSAGE_LENGTH:
+            key = (lexicon.revision, engine, normalize_message(message))
+            results[index] = _cache.get(key)
+            if results[index] is None:
+                missed.append((index, key, key[2]))
+        else:
+            missed.append((index, None, message))
+    if not missed:
+        return results
+
+    token_lists = [tokenize(message, lexicon) for index, key, message in missed]
+    if engine in BATCH_ENGINES:
+        classifications = BATCH_ENGINES[engine](token_lists, lexicon)
     else:
-        age_group = "senior"
-    
-    # -------------------------------------------------------------------
-    # CRISIS DETECTION - HIGHEST PRIORITY (Check FIRST)
-    # -------------------------------------------------------------------
-    crisis_phrases = [
-        'kill myself', 'kill me', 'end my life', 'end my life',
-        'want to die', 'better off dead', 'suicide', 'suicidal',
-        'harm myself', 'hurt myself', 'no reason to live',
-        'give up', 'can\'t go on', 'cannot go on', 'ending it all',
-        'worthless', 'i want to die', 'i wish i was dead',
-        'ready to die', 'end it all', 'stop living'
-    ]
-    
-    for phrase in crisis_phrases:
-        if phrase in message_lower:
-            return crisis_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # GENERAL CONVERSATION HANDLER - Check for common phrases FIRST
-    # -------------------------------------------------------------------
-    message_lower_no_punct = message_lower.replace('!', '').replace('?', '').replace('.', '').strip()
-    
-    # Greetings
-    greetings = ['hi', 'hello', 'hey', 'hola', 'greetings', 'good morning', 'good afternoon', 'good evening', 'whats up', 'sup']
-    for greet in greetings:
-        if greet in message_lower_no_punct or message_lower_no_punct == greet:
-            return greeting_response(age_group)
-    
-    # Gratitude / Thank you
-    thanks = ['thank', 'thanks', 'thank you', 'thanks a lot', 'appreciate it', 'thx', 'ty']
-    for thank in thanks:
-        if thank in message_lower_no_punct:
-            return gratitude_response(age_group)
-    
-    # Positive affirmations / agreement
-    positives = ['yes', 'yeah', 'yep', 'sure', 'ok', 'okay', 'fine', 'good', 'great', 'awesome', 'cool']
-    for pos in positives:
-        if message_lower_no_punct == pos or message_lower_no_punct.startswith(pos + ' '):
-            return positive_response(age_group)
-    
-    # Negatives / disagreement / no
-    negatives = ['no', 'nope', 'nah', 'not really', 'not at all', 'never mind']
-    for neg in negatives:
-        if message_lower_no_punct == neg or message_lower_no_punct.startswith(neg + ' '):
-            return negative_response(age_group)
-    
-    # Farewells / goodbye
-    goodbyes = ['bye', 'goodbye', 'see you', 'cya', 'take care', 'bye bye', 'good night', 'gn']
-    for bye in goodbyes:
-        if bye in message_lower_no_punct:
-            return goodbye_response(age_group)
-    
-    # Questions about the bot
-    bot_questions = ['who are you', 'what are you', 'your name', 'tell me about yourself', 'what can you do', 'how can you help']
-    for q in bot_questions:
-        if q in message_lower_no_punct:
-            return bot_intro_response(age_group)
-    
-    # Help requests
-    help_requests = ['help', 'i need help', 'can you help', 'assist', 'support']
-    for h in help_requests:
-        if h in message_lower_no_punct:
-            return help_response(age_group)
-    
-    # Negation words list
-    negation_words = ['not', "don't", 'dont', 'never', 'no', "can't", 'cant', "won't", 'wont', "didn't", 'didnt', "wasn't", 'wasnt']
-    
-    # Split message into words
-    words = message_lower.split()
-    
-    # Function to check if a keyword is negated
-    def is_negated(index, words, keyword):
-        if index > 0 and words[index-1] in negation_words:
-            return True
-        if index > 1 and words[index-2] in negation_words:
-            return True
-        if index > 0 and any(neg in words[index-1] for neg in ["n't", "not"]):
-            return True
-        return False
-    
-    # -------------------------------------------------------------------
-    # HAPPY / POSITIVE DETECTION
-    # -------------------------------------------------------------------
-    happy_keywords = ['happy', 'good', 'great', 'wonderful', 'excellent', 'joy', 'glad', 'fantastic', 'amazing', 'love', 'achievement', 'achievements', 'accomplishment', 'proud', 'success']
-    for i, word in enumerate(words):
-        if word in happy_keywords:
-            if is_negated(i, words, word):
-                return sad_response(age_group, "negated_happy")
-            else:
-                return happy_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # SAD / LONELY DETECTION
-    # -------------------------------------------------------------------
-    sad_keywords = ['sad', 'lonely', 'alone', 'depressed', 'empty', 'hurt', 'heartbroken', 'unhappy', 'miserable']
-    for i, word in enumerate(words):
-        if word in sad_keywords:
-            if is_negated(i, words, word):
-                return default_response(age_group)
-            else:
-                return sad_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # EXAM / STUDY STRESS
-    # -------------------------------------------------------------------
-    exam_keywords = ['exam', 'test', 'study', 'assignment', 'grade', 'fail', 'pass', 'paper', 'homework', 'class']
-    for i, word in enumerate(words):
-        if word in exam_keywords and not is_negated(i, words, word):
-            return exam_stress_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # WORK PRESSURE
-    # -------------------------------------------------------------------
-    work_keywords = ['work', 'deadline', 'boss', 'job', 'office', 'colleague', 'pressure', 'overload', 'meeting', 'career']
-    for i, word in enumerate(words):
-        if word in work_keywords and not is_negated(i, words, word):
-            return work_pressure_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # ANGER / FRUSTRATION
-    # -------------------------------------------------------------------
-    anger_keywords = ['angry', 'frustrated', 'annoyed', 'mad', 'irritated', 'hate', 'furious', 'upset']
-    for i, word in enumerate(words):
-        if word in anger_keywords and not is_negated(i, words, word):
-            return anger_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # ANXIETY / WORRY
-    # -------------------------------------------------------------------
-    anxiety_keywords = ['anxious', 'worry', 'nervous', 'scared', 'fear', 'panic', 'overthink', 'stress', 'worried']
-    for i, word in enumerate(words):
-        if word in anxiety_keywords and not is_negated(i, words, word):
-            return anxiety_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # TIRED / BURNOUT
-    # -------------------------------------------------------------------
-    tired_keywords = ['tired', 'exhausted', 'burnout', 'drained', 'fatigue', 'sleepy', 'worn out']
-    for i, word in enumerate(words):
-        if word in tired_keywords and not is_negated(i, words, word):
-            return tired_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # RELATIONSHIP ISSUES
-    # -------------------------------------------------------------------
-    relationship_keywords = ['relationship', 'boyfriend', 'girlfriend', 'partner', 'friend', 'fight', 'argument', 'love', 'breakup', 'divorce']
-    for i, word in enumerate(words):
-        if word in relationship_keywords and not is_negated(i, words, word):
-            return relationship_response(age_group)
-    
-    # -------------------------------------------------------------------
-    # DEFAULT RESPONSE
-    # -------------------------------------------------------------------
-    return default_response(age_group)
+        classifications = [ENGINES[engine](tokens, lexicon) for tokens in token_lists]
+    for (index, key, message), classification in zip(missed, classifications):
+        results[index] = classification
+        if key is not None:
+            _cache.put(key, classification)
+    return results
+
+
+def build_response(classification, age_group, lexicon=None):
+    """Pick a response for ``classification``, applying its stress score if it has one"""
+    result = respond(classification.pool, age_group, lexicon)
+    if classification.stress_score is None:
+        return result
+    return result.rescored(classification.stress_score, classification.scores)
+
+
+def apply_context(classification, message, context, lexicon=None, now=None):
+    """Carry the previous turn's emotion over to a short follow-up reply.
+
+    ``context`` holds the user's recent turns, oldest first, each with at
+    least ``emotion`` and ``at`` (a Unix time). A reply continues the last
+    turn when it is at most ``follow_up.max_words`` words long, starts with a
+    follow-up word ("yes", "still", ...), and the last turn is recent and
+    detected an emotion. Crisis always stands on its own. ``now`` is when
+    the reply was sent (default: the current time), for replaying saved
+    conversations.
+
+    Turns in ``context`` should hold each message's own emotion (see
+    ``turn_emotion``), so a carried-over emotion never carries on again.
+    """
+    lexicon = lexicon or _active
+    if not context or classification.pool == 'crisis':
+        return classification
+    previous = context[-1]
+    pool = lexicon.emotion_pools.get(previous.emotion)
+    if pool is None or pool not in lexicon.pool_order or pool == 'default':
+        return classification
+    if (time.time() if now is None else now) - previous.at > lexicon.follow_up_max_age:
+        return classification
+    if lexicon.stage_modes[lexicon.pool_order[pool]] in SMALL_TALK_MODES:
+        return classification
+
+    if not is_follow_up(message, lexicon):
+        return classification
+    return Classification(pool, None, ())
+
+
+def is_follow_up(message, lexicon=None):
+    """Whether ``message`` is a short reply starting with a follow-up word, one apply_context may carry into"""
+    lexicon = lexicon or _active
+    words = tokenize(message, lexicon).words
+    return bool(words) and len(words) <= lexicon.follow_up_max_words and words[0] in lexicon.follow_up_words
+
+
+def turn_emotion(message, engine=None):
+    """Emotion ``message`` shows on its own, without context; what a turn in the context buffer keeps"""
+    lexicon = _active
+    return lexicon.response_pools[classify(message, engine, lexicon).pool][0]
+
+
+def detect_emotion_and_respond(message, age=20, engine=None, context=None, tip_ranking=None, now=None):
+    """Detect emotion from message with age-based personalization and response variety
+
+    Returns an immutable ``DetectionResult``. The rules engine hands back a
+    shared result from the lexicon's response table; the scored engine adds
+    a ranked ``scores`` distribution and a continuous stress score.
+    ``context`` is the user's recent turns, used to read short follow-ups
+    like "yes" or "still bad" in light of the previous message; ``now`` is
+    the Unix time the message was sent when replaying an old one.
+    ``tip_ranking`` ('popular' or 'weighted') orders the tips by how often
+    users of the same age group saved them.
+    """
+    lexicon = _active
+    age_group = get_age_group(age)
+    classification = classify(message, engine, lexicon)
+    if context:
+        classification = apply_context(classification, message, context, lexicon, now)
+    result = build_response(classification, age_group, lexicon)
+    if tip_ranking:
+        result = rank_tips(result, age_group, tip_ranking)
+    return result
+
+
+def detect_emotions_batch(messages, ages=20, engine=None):
+    """Detect emotions for a list of messages in one call.
+
+    ``ages`` is either one age for every message or a list parallel to
+    ``messages``. Messages that normalize to the same text are tokenized and
+    classified once per batch. Returns one ``DetectionResult`` per message,
+    in order. Batch-capable engines classify the whole batch in one pass.
+    """
+    if isinstance(ages, (list, tuple)):
+        if len(ages) != len(messages):
+            raise ValueError("ages must have one entry per message")
+        age_groups = [get_age_group(age) for age in ages]
+    else:
+        age_groups = [get_age_group(ages)] * len(messages)
+
+    lexicon = _active
+    keys = [normalize_message(message) for message in messages]
+    unique = list(dict.fromkeys(keys))
+    classified = dict(zip(unique, classify_batch(unique, engine, lexicon)))
+    return [build_response(classified[key], age_group, lexicon)
+            for key, age_group in zip(keys, age_groups)]
 
 
 # ======================================================================
-# RESPONSE POOLS - MULTIPLE VARIATIONS FOR EACH EMOTION AND AGE GROUP
+# RESPONSES
 # ======================================================================
 
+def respond(pool, age_group, lexicon=None):
+    """Pick a random prebuilt response from ``pool`` for ``age_group``"""
+    return random.choice((lexicon or _active).variants[(pool, age_group)])
+
+
 # ----------------------------------------------------------------------
-# CRISIS RESPONSE - Life-saving support
+# RESPONSE FUNCTIONS - one per pool, kept for direct callers
 # ----------------------------------------------------------------------
 def crisis_response(age_group):
     """Special response for users in crisis - provides helpline information"""
-    
-    # Base crisis message with helplines
-    crisis_message = """🚨 **I'm really concerned about what you're sharing.** 🤍
-
-Your feelings are valid and you deserve immediate support. Please reach out to professionals who can help right now:
-
-🇮🇳 **India Crisis Helplines:**
-• **AASRA:** 91-9820466726 (24x7, Toll-free: 1800-233-3330)
-• **iCall:** 9152987821 (Mon-Sat, 10am-8pm)
-• **Sneha India:** 044-24640050 (24x7)
-• **Vandrevala Foundation:** 9999666555 (24x7)
-• **Emergency:** 112
-
-🌐 **Online Resources:**
-• https://www.aasra.info
-• https://www.vandrevalafoundation.com
-
-💬 **You can also:**
-• Talk to a trusted friend or family member
-• Go to the nearest hospital emergency room
-• Call a mental health professional
-
-**You matter. There are people who want to help.** 💕
-
-Would you like me to stay here and chat, or help you find more resources?"""
-    
-    # Age-specific comforting additions
-    age_messages = {
-        "teen": "Sweetheart, I know things feel impossible right now, but this feeling won't last forever. Please reach out for help. Your life is precious. 🌸",
-        "young_adult": "I hear how much pain you're in. Your 20s can be overwhelming, but please don't face this alone. Reach out to these resources. 💫",
-        "adult": "The weight you're carrying is heavy, but you don't have to carry it alone. Please contact one of these services. You deserve support. 🌿",
-        "senior": "Dear, your life has so much value. Please reach out to these caring professionals who understand what you're going through. 💝"
-    }
-    
-    # Combine messages
-    full_message = f"{crisis_message}\n\n{age_messages.get(age_group, '')}"
-    
-    return {
-        'emotion': 'CRISIS - URGENT SUPPORT NEEDED',
-        'stress_score': 10,
-        'stress_level': 'CRITICAL',
-        'stress_icon': '🚨',
-        'caring_response': full_message,
-        'tips': [
-            "🚨 Call AASRA: 91-9820466726 (24x7)",
-            "📞 Emergency Helpline: 112",
-            "💬 Talk to someone you trust immediately",
-            "🏥 Go to the nearest hospital if you're in immediate danger"
-        ]
-    }
+    return respond('crisis', age_group)
 
-
-# ----------------------------------------------------------------------
-# GENERAL CONVERSATION RESPONSES
-# ----------------------------------------------------------------------
 def greeting_response(age_group):
-    responses = {
-        "teen": [
-            "Hey there! 👋 So nice to hear from you. How's your day going?",
-            "Hi sweetheart! 🌸 What's on your mind today?",
-            "Hello! 😊 I'm here and ready to listen. How are you feeling?",
-            "Hey! 👋 Tell me what's happening in your world today."
-        ],
-        "young_adult": [
-            "Hi there! 👋 Good to see you. How's everything going?",
-            "Hello! 🌸 I'm here for you. What would you like to talk about?",
-            "Hey! 😊 How are you doing today?",
-            "Hi! 👋 Ready to listen whenever you're ready to share."
-        ],
-        "adult": [
-            "Hello! 👋 I'm glad you're here. How are you today?",
-            "Hi there! 🌸 What's on your mind? I'm all ears.",
-            "Greetings! 😊 How can I support you today?",
-            "Hello! 👋 Take your time - I'm here to listen."
-        ],
-        "senior": [
-            "Hello dear! 👋 So nice to hear from you. How are you today?",
-            "Hi there! 🌸 What's on your heart today?",
-            "Greetings! 😊 I'm always here when you need someone to talk to.",
-            "Hello! 👋 How has your day been, dear?"
-        ]
-    }
-    return {
-        'emotion': 'Greeting',
-        'stress_score': 1,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': random.choice(responses[age_group]),
-        'tips': ["🌸 I'm here to listen", "💬 Just start talking whenever you're ready"]
-    }
+    return respond('greeting', age_group)
 
 def gratitude_response(age_group):
-    responses = {
-        "teen": [
-            "You're so welcome, sweetheart! 🤗 That means a lot to me.",
-            "Aww, thank YOU for trusting me! 💕 How are you feeling?",
-            "You don't have to thank me - I'm here because I care about you. 🌸",
-            "That's so kind of you! 😊 How can I help you today?"
-        ],
-        "young_adult": [
-            "You're very welcome! 🤗 That's why I'm here.",
-            "Thank you for saying that! 💕 What's on your mind today?",
-            "It's my pleasure to be here for you. 🌸 How are things?",
-            "Aww, thank you! 😊 I'm glad you reached out."
-        ],
-        "adult": [
-            "You're so welcome! 🤗 That's what I'm here for.",
-            "Thank you for your kind words. 💕 How are you doing today?",
-            "It means a lot to hear that. 🌸 What would you like to talk about?",
-            "I appreciate that! 😊 How can I support you right now?"
-        ],
-        "senior": [
-            "You're most welcome, dear! 🤗 It's always a pleasure.",
-            "Thank you for your kindness. 💕 How are you today?",
-            "That's so sweet of you to say. 🌸 What's on your mind?",
-            "It's my joy to be here for you, dear. 😊"
-        ]
-    }
-    return {
-        'emotion': 'Gratitude',
-        'stress_score': 1,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': random.choice(responses[age_group]),
-        'tips': ["💕 Your kindness matters", "🌸 I'm always here for you"]
-    }
+    return respond('gratitude', age_group)
 
 def positive_response(age_group):
-    responses = {
-        "teen": [
-            "That's great to hear! 😊 What's making you feel positive today?",
-            "Awesome! 🌸 Tell me more about what's going well.",
-            "I love that energy! 💫 What's the good news?",
-            "So glad to hear that! 😊 Share your happiness with me."
-        ],
-        "young_adult": [
-            "That's wonderful! 😊 What's bringing that positivity?",
-            "Love to hear that! 🌸 Tell me more.",
-            "Great! 💫 What's going right for you today?",
-            "I'm so glad! 😊 What's contributing to that good feeling?"
-        ],
-        "adult": [
-            "That's good to hear! 😊 What's working well for you?",
-            "Wonderful! 🌸 I'm glad things are going in a positive direction.",
-            "That's great! 💫 Tell me more about what's happening.",
-            "I'm happy to hear that! 😊 What's bringing you this positivity?"
-        ],
-        "senior": [
-            "That's lovely to hear, dear! 😊 What's making you feel this way?",
-            "Wonderful! 🌸 I'm so glad things are well.",
-            "That's great! 💫 Share your good news with me.",
-            "I'm happy for you, dear! 😊 Tell me more."
-        ]
-    }
-    return {
-        'emotion': 'Positive',
-        'stress_score': 1,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': random.choice(responses[age_group]),
-        'tips': ["🌟 Celebrate the good moments", "💫 Positivity is powerful"]
-    }
+    return respond('positive', age_group)
 
 def negative_response(age_group):
-    responses = {
-        "teen": [
-            "I hear you saying no. 🌸 That's okay - you can tell me anything. What's on your mind?",
-            "No is a complete sentence. 💫 What would you like to talk about instead?",
-            "I understand. 🌱 Is there something else you'd like to share?",
-            "That's okay. 🌸 I'm still here whenever you're ready."
-        ],
-        "young_adult": [
-            "I hear you. 🌸 It's okay to say no. What's going on?",
-            "No is perfectly fine. 💫 Is there something you'd rather talk about?",
-            "I understand completely. 🌱 I'm here if you change your mind.",
-            "That's okay. 🌸 No pressure at all. I'm still here."
-        ],
-        "adult": [
-            "I hear you. 🌸 That's perfectly fine. How are you feeling otherwise?",
-            "No is always okay. 💫 I'm here whenever you need me.",
-            "I understand. 🌱 Is there something else on your mind?",
-            "That's completely fine. 🌸 I'm still here to listen."
-        ],
-        "senior": [
-            "I understand, dear. 🌸 That's perfectly okay.",
-            "No is always okay. 💫 I'm here for you whenever you need.",
-            "I hear you. 🌱 Would you like to talk about something else?",
-            "That's fine, dear. 🌸 I'm still here with you."
-        ]
-    }
-    return {
-        'emotion': 'Neutral',
-        'stress_score': 2,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': random.choice(responses[age_group]),
-        'tips': ["🌱 It's okay to say no", "🌸 I'm still here for you"]
-    }
+    return respond('negative', age_group)
 
 def goodbye_response(age_group):
-    responses = {
-        "teen": [
-            "Take care, sweetheart! 🌸 I'll be here when you come back.",
-            "Bye for now! 💫 Remember I'm always here if you need me.",
-            "See you later! 🌱 Hope you have a good day.",
-            "Take care! 😊 Come back anytime you want to talk."
-        ],
-        "young_adult": [
-            "Take care! 🌸 I'll be here whenever you need me.",
-            "Bye for now! 💫 Hope you have a great day.",
-            "See you later! 🌱 I'm always here to listen.",
-            "Take care! 😊 Come back anytime."
-        ],
-        "adult": [
-            "Take care! 🌸 I'm always here when you need someone.",
-            "Bye for now! 💫 Hope your day goes well.",
-            "See you next time! 🌱 I'll be here.",
-            "Take care! 😊 Anytime you need to talk, I'm here."
-        ],
-        "senior": [
-            "Take care, dear! 🌸 It was nice talking with you.",
-            "Goodbye for now! 💫 I'm always here when you need me.",
-            "See you soon, dear! 🌱 Hope you have a peaceful day.",
-            "Take care! 😊 Come back anytime you want to chat."
-        ]
-    }
-    return {
-        'emotion': 'Goodbye',
-        'stress_score': 1,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': random.choice(responses[age_group]),
-        'tips': ["🌸 I'll be here when you return", "💫 Take care of yourself"]
-    }
+    return respond('goodbye', age_group)
 
 def bot_intro_response(age_group):
-    responses = {
-        "teen": [
-            "I'm Serenity! 🌸 Think of me as a caring friend who's always here to listen. You can tell me anything - about school, friends, stress, or whatever's on your mind. I'll never judge, only support. 💫",
-            "I'm your virtual companion! 😊 I'm here to listen when you're stressed, sad, happy, or just need someone to talk to. You can talk about anything with me. 🌸",
-            "I'm Serenity! 💕 I help with stress and emotions. Just chat with me like you would with a caring friend. I'm always here, 24/7, no judgment. 🌸"
-        ],
-        "young_adult": [
-            "I'm Serenity! 🌸 Think of me as a supportive companion for your emotional wellbeing. You can talk about work stress, relationships, anxiety, or just vent - I'm here to listen and support you. 💫",
-            "I'm your caring virtual friend! 😊 I help detect stress and emotions through conversation, and offer gentle support and tips. Whatever you're going through, I'm here. 🌸",
-            "I'm Serenity! 💕 A safe space to express your feelings. Talk about anything - career, relationships, life stress - and I'll respond with care and understanding. 🌸"
-        ],
-        "adult": [
-            "I'm Serenity! 🌸 I'm here to provide emotional support through conversation. Whether it's work pressure, family stress, or just needing someone to listen - I'm that someone. 💫",
-            "I'm your companion for emotional wellness. 😊 Share what's on your heart - I'll listen without judgment and offer gentle, caring responses. I'm always here. 🌸",
-            "I'm Serenity! 💕 Think of me as a caring friend who's available 24/7. Work stress, life challenges, emotional ups and downs - let's talk about it. 🌸"
-        ],
-        "senior": [
-            "I'm Serenity, dear! 🌸 I'm here to listen and chat with you. Whatever's on your heart - worries, memories, feelings - I'm here to share the moment with you. 💫",
-            "I'm your caring companion! 😊 Think of me as a friendly ear. You can tell me anything, and I'll always respond with kindness and understanding. 🌸",
-            "I'm Serenity! 💕 I'm here to keep you company and listen. Loneliness, worries, happy thoughts - share them with me. I'm always here, dear. 🌸"
-        ]
-    }
-    return {
-        'emotion': 'Introduction',
-        'stress_score': 1,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': random.choice(responses[age_group]),
-        'tips': ["🌸 I'm here 24/7", "💫 You can talk about anything", "🌟 No judgment, only care"]
-    }
+    return respond('bot_intro', age_group)
 
 def help_response(age_group):
-    responses = {
-        "teen": [
-            "Of course I can help! 🌸 You can talk to me about stress, exams, friends, family - anything really. Just start typing and I'll listen and respond with care. 💫",
-            "I'm here to help! 😊 Tell me what's going on - I'll listen and offer support. You can talk about anything that's on your mind. 🌸",
-            "I'd love to help! 💕 Just share what's bothering you, or even what's making you happy. I'm here to listen and respond. 🌸"
-        ],
-        "young_adult": [
-            "I'm here to help however I can! 🌸 Talk to me about stress, work, relationships, anxiety - anything. I'll listen and respond with caring support. 💫",
-            "Of course! 😊 This is a safe space. Share whatever's on your mind - I'm here to listen and offer gentle guidance. 🌸",
-            "I'd be happy to help! 💕 Whether you need to vent, seek advice, or just chat - I'm here for you. What's on your mind? 🌸"
-        ],
-        "adult": [
-            "I'm here to help! 🌸 Work stress, family matters, emotional challenges - let's talk about it. I'll listen and support you. 💫",
-            "Of course! 😊 This is your space to share. Whatever you're dealing with, I'm here to listen without judgment. 🌸",
-            "I'd love to help! 💕 Tell me what's going on - I'll respond with care and maybe some gentle tips. You're not alone. 🌸"
-        ],
-        "senior": [
-            "I'm always here to help, dear! 🌸 Whatever's on your heart - share it with me. I'll listen with care and kindness. 💫",
-            "Of course! 😊 This is a safe place. Tell me what you need - a listening ear, comfort, or just someone to talk to. 🌸",
-            "I'd be honored to help, dear! 💕 What's on your mind today? I'm here to listen and share the moment with you. 🌸"
-        ]
-    }
-    return {
-        'emotion': 'Help',
-        'stress_score': 1,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': random.choice(responses[age_group]),
-        'tips': ["🌸 I'm here to listen", "💫 You're not alone", "🌟 Just start talking"]
-    }
-
+    return respond('help', age_group)
 
-# ----------------------------------------------------------------------
-# HAPPINESS RESPONSES
-# ----------------------------------------------------------------------
 def happy_response(age_group):
-    response_pool = {
-        "teen": [
-            {
-                "msg": "That's wonderful to hear you're feeling happy! 😊 Your energy is contagious! What's bringing you joy today? Is it friends, a hobby, or something exciting happening at school?",
-                "tips": ["🌸 Hold onto this feeling - you deserve it!", "📱 Share your joy with friends - they'll love it!", "🎵 Dance to your favorite music!", "📸 Take a photo of something that made you smile today"]
-            },
-            {
-                "msg": "I love seeing you happy! 😊 It lights up my heart. Tell me more about what's making you feel this way - I'd love to share in your joy!",
-                "tips": ["💫 This happiness is yours to enjoy!", "🎮 Do something you love today!", "☀️ Get outside and enjoy the day!", "📝 Write down three good things about today"]
-            },
-            {
-                "msg": "Happiness looks beautiful on you! 😊 These moments are precious. What's the best part of your day so far?",
-                "tips": ["🎵 Sing along to your favorite song!", "🍦 Treat yourself to something you enjoy!", "💬 Call or text a friend who makes you laugh!", "🌟 You deserve every bit of this happiness"]
-            }
-        ],
-        "young_adult": [
-            {
-                "msg": "I'm so glad you're feeling happy! 😊 That positive energy is wonderful. Whether it's achievements, relationships, or just a good day - celebrate these moments. What's contributing to your happiness right now?",
-                "tips": ["🌸 Savor these moments - they matter", "📝 Write down what made you happy today", "☕ Treat yourself to something you enjoy", "💫 Share your joy with someone close to you"]
-            },
-            {
-                "msg": "Happiness in the midst of busy adult life is something to cherish! 😊 What's bringing you this joy today?",
-                "tips": ["🌿 Take a moment to really feel this happiness", "📞 Call someone who would love to hear from you", "🎯 Celebrate your wins, big or small", "💝 You deserve happiness"]
-            },
-            {
-                "msg": "Your happiness makes my day! 😊 Tell me more - what's going well for you right now?",
-                "tips": ["☀️ Enjoy this feeling while it lasts", "📖 Remember this moment on harder days", "👥 Share your joy with others", "💫 You're doing something right!"]
-            }
-        ],
-        "adult": [
-            {
-                "msg": "What a beautiful thing to hear - happiness is precious at any age. 😊 In the midst of responsibilities and routines, moments of joy are treasures. What's bringing you happiness today?",
-                "tips": ["🌸 Let yourself fully enjoy this feeling", "📞 Share with someone who matters to you", "🌿 Take a moment to breathe and appreciate", "💝 You deserve every bit of this happiness"]
-            },
-            {
-                "msg": "I'm so happy to hear you're happy! 😊 Adult life can be so demanding - these moments of joy are precious. What's going well for you?",
-                "tips": ["🎯 Celebrate this moment", "👨‍👩‍👧 Share your happiness with family", "📝 Note what's working in your life", "💪 Let this energy fuel you"]
-            },
-            {
-                "msg": "Happiness at your stage of life often comes from deeper places - and that's beautiful. 😊 What's bringing you this joy?",
-                "tips": ["🌿 Appreciate the simple pleasures", "📞 Connect with someone who shares your joy", "☕ Savor a quiet moment", "💝 You've earned this happiness"]
-            }
-        ],
-        "senior": [
-            {
-                "msg": "Hearing that you're happy warms my heart. 😊 At your stage of life, happiness often comes from a deeper place - family connections, good health, peaceful moments, or fond memories. What's bringing you joy today, dear?",
-                "tips": ["🌸 Cherish this moment of happiness", "📞 Call someone who would love to hear from you", "📖 Write about this happy moment", "🌿 Simple joys are often the deepest"]
-            },
-            {
-                "msg": "What a blessing to hear you're happy! 😊 At this stage of life, every moment of joy is precious. What's making you smile today?",
-                "tips": ["📸 Capture this happy moment", "👵 Share your joy with loved ones", "☕ Enjoy a peaceful moment", "💝 Happiness suits you, dear"]
-            },
-            {
-                "msg": "Your happiness brings me joy too! 😊 Tell me what's brightening your days lately.",
-                "tips": ["🌿 Peace and joy go hand in hand", "📞 Reach out to someone who cares", "📖 Reflect on life's blessings", "🌸 You deserve all the happiness"]
-            }
-        ]
-    }
-    
-    selected = random.choice(response_pool[age_group])
-    return {
-        'emotion': 'Happiness',
-        'stress_score': 1,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
-
+    return respond('happy', age_group)
 
-# ----------------------------------------------------------------------
-# SADNESS RESPONSES
-# ----------------------------------------------------------------------
 def sad_response(age_group, reason="general"):
-    response_pool = {
-        "teen": {
-            "general": [
-                {
-                    "msg": "Oh sweetie, I hear that you're feeling sad. 🤗 Being a teenager is tough sometimes - with school, friends, and figuring out who you are. Whatever you're going through, your feelings are valid. Want to tell me more?",
-                    "tips": ["🎵 Listen to music that matches or lifts your mood", "📱 Text a friend who gets you", "🛋️ Take some time for yourself", "🧸 Do something small that usually brings you comfort"]
-                },
-                {
-                    "msg": "I'm so sorry you're feeling this way, sweetheart. 🤗 It's okay to be sad. Emotions come and go like clouds. Would you like to talk about what's bothering you?",
-                    "tips": ["💧 Let yourself cry if you need to", "🎨 Draw or paint how you feel", "📝 Write in a journal", "🐶 Spend time with a pet if you have one"]
-                },
-                {
-                    "msg": "My heart goes out to you, dear. 🤗 Being young doesn't mean your feelings aren't real and deep. What's weighing on your heart today?",
-                    "tips": ["🌱 Remember this feeling will pass", "📱 Reach out to someone who understands", "🎮 Do something distracting for a bit", "😴 Rest - emotions are tiring"]
-                }
-            ],
-            "negated": [
-                {
-                    "msg": "I hear that you're not feeling happy right now. 🤗 Sometimes when we say we're 'not happy', there's something deeper going on. Is everything okay? I'm here to listen.",
-                    "tips": ["💭 What would make today better?", "📝 Try writing down your thoughts", "☕ Take a moment for yourself", "🌱 Small steps help"]
-                },
-                {
-                    "msg": "Not feeling happy is completely okay sometimes. 🤗 Life has ups and downs. What's been on your mind lately?",
-                    "tips": ["🎵 Music might help shift your mood", "📞 Call someone who makes you smile", "🚶 A short walk might help", "💫 Tomorrow is a new day"]
-                }
-            ]
-        },
-        "young_adult": {
-            "general": [
-                {
-                    "msg": "I hear the sadness in your words, and it's okay to feel this way. 🤗 Young adulthood comes with so many pressures - studies, career, relationships, finances. It's a lot to carry. Would you like to talk about what's weighing on your heart?",
-                    "tips": ["🎵 Put on music that comforts you", "☕ Take a break with a warm drink", "📝 Write down what you're feeling", "🌱 Remember, this feeling will pass"]
-                },
-                {
-                    "msg": "I'm here with you in this sadness. 🤗 Your 20s can be such a confusing time. What's making you feel this way?",
-                    "tips": ["🌬️ Breathe deeply for a moment", "📞 Call someone who gets it", "🚶 A change of scenery might help", "💪 You've survived hard days before"]
-                },
-                {
-                    "msg": "Sadness at your age is so valid. 🤗 There's so much pressure to have it all figured out. But nobody really does. What's happening?",
-                    "tips": ["📖 Read something comforting", "☕ Treat yourself gently today", "🧘 Give yourself permission to rest", "🌈 This too shall pass"]
-                }
-            ],
-            "negated": [
-                {
-                    "msg": "I hear that you're not feeling your best right now. 🤗 It's okay to have days when things don't feel right. What's been going on?",
-                    "tips": ["🌱 Start with something small today", "📝 Check in with yourself", "☕ Little comforts help", "💫 Better days are ahead"]
-                },
-                {
-                    "msg": "Not every day can be a good day, and that's okay. 🤗 What would help you feel even a little better right now?",
-                    "tips": ["🎵 Play a favorite song", "📞 Text someone who cares", "🚶 Step outside for air", "🌟 You're doing okay"]
-                }
-            ]
-        },
-        "adult": {
-            "general": [
-                {
-                    "msg": "I'm so sorry you're feeling this sadness. 🤗 As adults, we often feel we have to be strong for everyone else. But it's okay to not be okay. Life's challenges - work, family, responsibilities - can feel overwhelming sometimes. What's on your mind?",
-                    "tips": ["🌿 Give yourself permission to rest", "📞 Call someone who understands you", "☕ Take a quiet moment for yourself", "💪 You've gotten through hard days before"]
-                },
-                {
-                    "msg": "This weight you're carrying - I can feel it through your words. 🤗 Adult life can be so heavy sometimes. What's the heaviest part right now?",
-                    "tips": ["🌬️ Breathe - just for a moment", "📝 Write down what's overwhelming you", "👥 You don't have to carry it alone", "🌱 Small steps, one at a time"]
-                },
-                {
-                    "msg": "I'm here, and I'm listening. 🤗 Sadness at this stage of life often has many layers. What's beneath the surface for you today?",
-                    "tips": ["💧 It's okay to let it out", "📞 Reach out to a trusted friend", "🚶 Sometimes a walk helps clear the mind", "💝 Be gentle with yourself"]
-                }
-            ],
-            "negated": [
-                {
-                    "msg": "I hear that things aren't feeling good right now. 🤗 Sometimes the weight of daily responsibilities can leave us feeling empty. You don't have to carry it all alone. Want to share what's been happening?",
-                    "tips": ["🌿 Start with one small thing", "📝 Check in with your feelings", "☕ A small comfort can help", "💫 This moment will pass"]
-                },
-                {
-                    "msg": "Not feeling good is completely valid. 🤗 What would make today even slightly better?",
-                    "tips": ["🎵 Something that usually lifts you", "📞 A quick call to someone", "🚶 Fresh air and movement", "🌟 You're doing your best"]
-                }
-            ]
-        },
-        "senior": {
-            "general": [
-                {
-                    "msg": "My heart goes out to you, dear. 🤗 At this stage of life, sadness can come from many places - missing loved ones, health concerns, or reflecting on the past. Whatever it is, you're not alone. Would you like to share what's on your heart?",
-                    "tips": ["📖 Look at photos that bring back happy memories", "📞 Call someone who would love to hear your voice", "🌿 Spend time in nature if you can", "☕ Have a cup of tea and be gentle with yourself"]
-                },
-                {
-                    "msg": "I'm sitting with you in this moment of sadness. 🤗 Life's journey has so many chapters - some happy, some hard. What's weighing on you today?",
-                    "tips": ["📖 Reflect on happy memories too", "👵 Reach out to family or friends", "🌿 A quiet moment in nature helps", "💝 You are loved"]
-                },
-                {
-                    "msg": "Your feelings matter at every age, dear. 🤗 What's causing this sadness today?",
-                    "tips": ["☕ A warm drink and quiet time", "📞 Call someone who cares", "📖 Read something comforting", "🌸 Be gentle with your heart"]
-                }
-            ],
-            "negated": [
-                {
-                    "msg": "I'm sorry you're not feeling well today, dear. 🤗 Some days are harder than others, and that's completely normal. Is there something specific troubling you?",
-                    "tips": ["🌿 Rest if you need to", "☕ A small comfort helps", "📞 Someone would love to hear from you", "💫 Tomorrow may be brighter"]
-                },
-                {
-                    "msg": "Not every day can be bright, and that's okay. 🤗 What might bring you a moment of peace today?",
-                    "tips": ["📖 Read a few pages of something", "🌿 Look out the window at nature", "☕ Sip something warm slowly", "💝 Be kind to yourself today"]
-                }
-            ]
-        }
-    }
-    
-    key = "negated" if reason == "negated_happy" else "general"
-    selected = random.choice(response_pool[age_group][key])
-    
-    return {
-        'emotion': 'Sadness',
-        'stress_score': 6,
-        'stress_level': 'Medium',
-        'stress_icon': '🟡',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
+    return respond('sad_negated' if reason == "negated_happy" else 'sad', age_group)
 
-
-# ----------------------------------------------------------------------
-# TIRED / BURNOUT RESPONSES (with variety)
-# ----------------------------------------------------------------------
 def tired_response(age_group):
-    response_pool = {
-        "teen": [
-            {
-                "msg": "You sound exhausted, sweetheart. School, activities, social life - it's a lot. 🌙 Your body and mind are telling you they need rest. It's okay to take a break. When did you last really rest?",
-                "tips": ["😴 Sleep is your best friend", "📱 Put your phone away an hour before bed", "🛏️ Make your room cozy and calm", "🌙 Even 10 minutes of doing nothing helps"]
-            },
-            {
-                "msg": "I can hear how tired you are. 🌙 Being a teenager is exhausting - so much pressure, so little sleep. Please be kind to yourself and rest when you can.",
-                "tips": ["😴 Aim for 8-9 hours of sleep", "📵 No screens before bed", "🎵 Calming music helps", "🌙 Rest is productive too"]
-            },
-            {
-                "msg": "You sound drained, sweetheart. 🌙 Between school, activities, and social life, it's no wonder. Your body is asking for a break. Will you give it one?",
-                "tips": ["😴 Sleep is when you grow and heal", "🛏️ Make your bedroom a cozy nest", "🧘 Try some deep breathing", "🌙 You can't pour from an empty cup"]
-            }
-        ],
-        "young_adult": [
-            {
-                "msg": "Burnout in your 20s is real - trying to build a career, maintain relationships, and figure out life. 🌙 You're not a machine. You need rest to recharge. When did you last take time just for yourself?",
-                "tips": ["😴 Sleep 7-8 hours - it's non-negotiable", "🚫 Say 'no' to one thing this week", "🥗 Eat something nourishing", "☁️ Do absolutely nothing for 10 minutes"]
-            },
-            {
-                "msg": "I hear the exhaustion in your words. 🌙 Your 20s can be so demanding. But burning out helps no one. What's one thing you can let go of today?",
-                "tips": ["😴 Prioritize sleep like it's your job", "📵 Put devices away before bed", "🚶 A short walk might help", "🌿 Rest is not lazy - it's necessary"]
-            },
-            {
-                "msg": "You sound completely drained. 🌙 The hustle culture tells you to keep going, but your body is waving a white flag. Please listen to it.",
-                "tips": ["😴 Sleep is your superpower", "🚫 Protect your energy fiercely", "🥗 Nourish yourself", "☁️ Rest, guilt-free"]
-            }
-        ],
-        "adult": [
-            {
-                "msg": "Exhaustion as an adult is so common - work, kids, responsibilities never end. 🌙 But you can't pour from an empty cup. Rest isn't lazy, it's necessary. What's one thing you can let go of today?",
-                "tips": ["🛌 Sleep is medicine - rest early tonight", "🐢 Take today slowly - do only what's necessary", "🥗 Fuel your body with good food", "🚫 Protect your energy - say no to something"]
-            },
-            {
-                "msg": "Adult fatigue is real and valid. 🌙 Juggling everything is exhausting. But you matter too. When did you last do something just for you?",
-                "tips": ["😴 Prioritize rest this week", "📞 Delegate if you can", "🌿 Even 15 minutes of peace helps", "💪 You can't do it all - and that's okay"]
-            },
-            {
-                "msg": "The weight of adult responsibilities is heavy. 🌙 No wonder you're tired. What would one hour of guilt-free rest look like for you?",
-                "tips": ["😴 Sleep is not optional - it's essential", "🚫 Say no without explaining", "🥗 Eat something that nourishes", "🌿 Rest recharges your patience too"]
-            }
-        ],
-        "senior": [
-            {
-                "msg": "Fatigue can be harder as we age, dear. Your body knows what it needs. 🌙 Listen to it. Rest is not a weakness - it's wisdom. Have you been able to rest well lately?",
-                "tips": ["😴 Rest when you need to - no guilt", "☕ A warm drink and quiet moment helps", "🌿 Gentle movement if you feel up to it", "📖 Rest can also mean peaceful activities"]
-            },
-            {
-                "msg": "I hear your tiredness, dear. 🌙 At your stage, energy is precious. Don't waste it on things that don't matter. Rest when you need to.",
-                "tips": ["😴 Listen to your body's signals", "☕ Rest with a cup of tea", "📖 A good book and quiet time", "🌿 Peace is more important than productivity"]
-            },
-            {
-                "msg": "You've earned the right to rest whenever you need, dear. 🌙 Don't feel guilty about it. Rest is wisdom, not weakness.",
-                "tips": ["😴 Sleep when you're tired", "☕ Enjoy quiet moments", "📞 Rest doesn't mean isolation - call someone", "🌿 Gentle days are good days"]
-            }
-        ]
-    }
-    
-    selected = random.choice(response_pool[age_group])
-    return {
-        'emotion': 'Burnout/Exhaustion',
-        'stress_score': 7,
-        'stress_level': 'High',
-        'stress_icon': '🔴',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
-
+    return respond('tired', age_group)
 
-# ----------------------------------------------------------------------
-# EXAM STRESS RESPONSES (with variety)
-# ----------------------------------------------------------------------
 def exam_stress_response(age_group):
-    response_pool = {
-        "teen": [
-            {
-                "msg": "Oh sweetheart, exams can feel like the whole world right now. 🌸 But here's the truth - one test does NOT define you. You're so much more than a grade. What subject is worrying you most?",
-                "tips": ["📚 Study in 25-minute chunks with 5-minute breaks", "🍫 Treat yourself after each study session", "💬 Talk to your friends - they're stressed too!", "😴 Sleep is your best friend before an exam"]
-            },
-            {
-                "msg": "I remember how much pressure school exams can bring. 🌸 Your best is always enough, no matter what the score says. How can I support you right now?",
-                "tips": ["📝 Make a study plan - small steps help", "🎯 Focus on progress, not perfection", "🥗 Don't skip meals - your brain needs fuel", "💪 You've prepared for this"]
-            },
-            {
-                "msg": "Exam stress is real, and it's okay to feel it. 🌸 But don't let it convince you that you're not smart enough. You are. What's the hardest subject for you?",
-                "tips": ["📚 One topic at a time", "🧠 Teach someone else - it helps you learn", "💧 Stay hydrated - your brain needs water", "😴 All-nighters do more harm than good"]
-            }
-        ],
-        "young_adult": [
-            {
-                "msg": "I hear you - college exams, certifications, or important tests can be incredibly stressful. 🌸 You're at a stage where exams can feel like they determine your future. But they don't. They're just one step in a long journey.",
-                "tips": ["☕ Take breaks - all-nighters do more harm than good", "📝 Practice past papers - they're gold", "🥗 Eat well - your brain needs fuel", "🎯 Focus on understanding, not just memorizing"]
-            },
-            {
-                "msg": "The pressure you're under is real. 🌸 Exams at this stage feel so high-stakes. But you've gotten through every challenge so far - you'll get through this too.",
-                "tips": ["📚 Create a study schedule you can stick to", "🧠 Active recall works better than re-reading", "👥 Study groups can help", "💪 Trust your preparation"]
-            },
-            {
-                "msg": "I can feel your exam anxiety through your words. 🌸 Remember that this moment is temporary. A few years from now, this exam will be a distant memory.",
-                "tips": ["🎯 Focus on what you can control", "🌬️ Breathe when you feel overwhelmed", "📝 Write down what you know", "😴 Sleep consolidates memory - don't skip it"]
-            }
-        ],
-        "adult": [
-            {
-                "msg": "Professional exams or certifications while juggling work and family? That's genuinely tough. 🌸 The fact that you're still pushing forward shows your dedication. But remember - your health matters more than any test.",
-                "tips": ["⏰ Schedule study time like important meetings", "🏃 Take short walks to clear your mind", "👨‍👩‍👧 Involve your family in your journey", "💪 You're building skills, not just passing tests"]
-            },
-            {
-                "msg": "Returning to exams as an adult is brave and challenging. 🌸 Life is already full - adding study pressure is no small thing. Be proud of yourself for taking this on.",
-                "tips": ["📚 Study when you're most alert", "🎯 Prioritize - you don't need to know everything", "👥 Find other adult learners for support", "😴 Sleep is when your brain processes learning"]
-            },
-            {
-                "msg": "I admire your dedication to keep learning at this stage. 🌸 But don't let exams steal your peace. What's the biggest challenge you're facing with studying?",
-                "tips": ["📝 Break material into smaller chunks", "🌿 Study in a calm, organized space", "🥗 Brain foods - nuts, berries, fish", "💪 You're adding to your skills, not just passing"]
-            }
-        ],
-        "senior": [
-            {
-                "msg": "Learning at any age is beautiful and brave. 🌸 Whether you're studying for interest, qualification, or personal growth - I admire your dedication. Go at your own pace, and be proud of yourself.",
-                "tips": ["📖 Enjoy the learning - no rush", "☕ Make it a pleasant ritual with tea", "🧠 Keep that mind active and young", "🌟 Be proud of yourself for growing"]
-            },
-            {
-                "msg": "How wonderful that you're still learning! 🌸 Exams may feel different at this stage, but your commitment is inspiring. How can I support you?",
-                "tips": ["📚 Study when you feel most alert", "🌿 Take breaks when you need them", "🧠 Learning keeps your mind sharp", "💝 Be gentle with yourself - you're doing great"]
-            },
-            {
-                "msg": "Learning has no age limit, and I'm so proud of you. 🌸 What motivated you to take on this study?",
-                "tips": ["📖 Focus on understanding, not memorizing", "☕ Pair study with something pleasant", "🧠 Your experience is your advantage", "🌟 Every step forward counts"]
-            }
-        ]
-    }
-    
-    selected = random.choice(response_pool[age_group])
-    return {
-        'emotion': 'Exam Stress',
-        'stress_score': 7,
-        'stress_level': 'High',
-        'stress_icon': '🔴',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
-
+    return respond('exam_stress', age_group)
 
-# ----------------------------------------------------------------------
-# WORK PRESSURE RESPONSES (with variety)
-# ----------------------------------------------------------------------
 def work_pressure_response(age_group):
-    response_pool = {
-        "teen": [
-            {
-                "msg": "Even at your age, there can be pressure - maybe from part-time jobs, school responsibilities, or family expectations. 🌸 Whatever it is, you shouldn't have to carry it alone. What's weighing on you?",
-                "tips": ["🌿 It's okay to say 'no' sometimes", "💬 Talk to someone you trust", "🎯 Break tasks into smaller pieces", "😴 Rest is not lazy - it's necessary"]
-            },
-            {
-                "msg": "I hear you're under pressure. 🌸 You're young - you shouldn't have to carry so much. What's the biggest source of stress for you?",
-                "tips": ["📝 Write down what's overwhelming you", "🎯 One thing at a time", "💬 Talk to an adult you trust", "🌿 You're allowed to take breaks"]
-            }
-        ],
-        "young_adult": [
-            {
-                "msg": "Work pressure in your 20s can be intense - building a career, proving yourself, financial pressure. 🌸 I see how hard you're working, and I'm proud of you. But don't forget - you're a human being, not a machine.",
-                "tips": ["🌿 Set boundaries - even small ones help", "📝 Make a list and do just ONE thing at a time", "💬 Talk to colleagues - you're not alone", "🏠 Leave work at work when you can"]
-            },
-            {
-                "msg": "The pressure to establish yourself is real. 🌸 But burning out won't help your career. What's the most overwhelming part of work right now?",
-                "tips": ["⏰ Time-block your day", "🚫 Learn to say no gracefully", "👥 Find a mentor or supporter", "💪 You're building skills, not just completing tasks"]
-            },
-            {
-                "msg": "I can feel how much pressure you're under. 🌸 Your 20s are for learning, not for killing yourself over work. What would help lighten the load?",
-                "tips": ["🌿 Separate work from home life", "📝 Prioritize ruthlessly", "💬 Talk to your manager if possible", "😴 Sleep is not negotiable"]
-            }
-        ],
-        "adult": [
-            {
-                "msg": "Work pressure in your 40s often comes with so much responsibility - managing teams, meeting targets, while balancing family. 🌸 That's a lot for anyone to carry. Remember why you started, but also know when to pause.",
-                "tips": ["🌿 Delegate when possible", "📞 Talk to someone who understands", "🏃 Take short breaks during the day", "👨‍👩‍👧 Don't let work steal family time"]
-            },
-            {
-                "msg": "The weight of mid-career responsibility is heavy. 🌸 You're carrying so much - for your team, your family, yourself. What's one thing you could let go of?",
-                "tips": ["🌿 Set firmer boundaries", "📝 Focus on high-impact tasks", "👥 Build a support network at work", "💪 You've handled challenges before"]
-            },
-            {
-                "msg": "I hear the exhaustion in your words about work. 🌸 Adulting is hard, and work often takes more than it gives. What would make tomorrow better?",
-                "tips": ["🌿 Protect your time off fiercely", "🎯 One goal per day is enough", "📞 Connect with understanding colleagues", "😴 Rest is how you sustain performance"]
-            }
-        ],
-        "senior": [
-            {
-                "msg": "Even in your 60s, work can still bring pressure - whether it's professional or personal projects. 🌸 But at this stage, hopefully you've learned that peace matters more. Is there a way to lighten your load?",
-                "tips": ["🌿 Prioritize what truly matters", "☕ Take time for yourself daily", "👵 Don't be afraid to ask for help", "🌟 You've earned the right to pace yourself"]
-            },
-            {
-                "msg": "You've worked so hard throughout your life. 🌸 If work is still stressful, maybe it's time to ask - is this still serving you?",
-                "tips": ["🌿 Consider what you truly want", "📞 Talk to family about your stress", "🧘 Peace is more valuable than productivity", "💝 Your well-being comes first"]
-            }
-        ]
-    }
-    
-    selected = random.choice(response_pool[age_group])
-    return {
-        'emotion': 'Work Pressure',
-        'stress_score': 7,
-        'stress_level': 'High',
-        'stress_icon': '🔴',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
-
+    return respond('work_pressure', age_group)
 
-# ----------------------------------------------------------------------
-# ANGER RESPONSES (with variety)
-# ----------------------------------------------------------------------
 def anger_response(age_group):
-    response_pool = {
-        "teen": [
-            {
-                "msg": "I can feel your frustration, and it's completely okay to feel this way. 💫 Being a teenager comes with so many emotions - sometimes it all just bubbles over. Take a deep breath with me. What happened?",
-                "tips": ["🚶 Step away for a few minutes", "✍️ Write down what you're feeling", "🎵 Listen to music that helps", "💬 Talk to someone who will just listen"]
-            },
-            {
-                "msg": "That anger is real and valid. 💫 Before you react, take a moment. What's really underneath the anger? Hurt? Fear? Disappointment?",
-                "tips": ["🌬️ Take three deep breaths", "🏃 Physical activity helps release anger", "📝 Journal your feelings", "🧸 Do something that calms you"]
-            }
-        ],
-        "young_adult": [
-            {
-                "msg": "Anger and frustration are valid emotions - especially when you're dealing with so many pressures. 💫 Sometimes anger is just sadness or fear in disguise. Take a moment to breathe. What triggered this?",
-                "tips": ["🚶 Take a walk to clear your head", "✍️ Journal your feelings", "💦 Splash cold water on your face", "👂 Talk to someone who will listen without judging"]
-            },
-            {
-                "msg": "I hear how frustrated you are. 💫 Life in your 20s can feel so unfair sometimes. What's really going on beneath the anger?",
-                "tips": ["🌬️ Breathe before you speak or act", "🎵 Intense music can help release", "🏋️ Physical exercise helps", "📞 Call someone who calms you"]
-            }
-        ],
-        "adult": [
-            {
-                "msg": "I hear the frustration in your voice. Life's demands can be overwhelming. 💫 Before reacting, take a breath. What's the root of this anger - work, relationships, or feeling unheard?",
-                "tips": ["🌬️ Take three deep breaths right now", "🚶 Step away from the situation temporarily", "📞 Talk to someone who supports you", "💪 Channel that energy into something constructive"]
-            },
-            {
-                "msg": "Anger at this stage of life often comes from feeling powerless or unappreciated. 💫 What's really at the heart of this?",
-                "tips": ["📝 Write down what you need to say", "🌿 Find a healthy outlet", "👥 Seek understanding, not just venting", "🧘 Give yourself space to cool down"]
-            }
-        ],
-        "senior": [
-            {
-                "msg": "It's never easy to feel angry or frustrated, especially at this stage of life. 💫 Maybe things aren't as they used to be, or people aren't understanding you. What's troubling you, dear?",
-                "tips": ["🌿 Take a quiet moment for yourself", "📖 Read or do something calming", "☕ Have a cup of tea and breathe", "💬 Talk to someone patient and kind"]
-            },
-            {
-                "msg": "Anger at any age is hard to carry. 💫 What's causing this feeling? Sometimes just naming it helps.",
-                "tips": ["🌬️ Breathe slowly", "🚶 A gentle walk might help", "📞 Call someone who listens", "🌿 Peace is precious - protect yours"]
-            }
-        ]
-    }
-    
-    selected = random.choice(response_pool[age_group])
-    return {
-        'emotion': 'Anger/Frustration',
-        'stress_score': 7,
-        'stress_level': 'High',
-        'stress_icon': '🔴',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
+    return respond('anger', age_group)
 
-
-# ----------------------------------------------------------------------
-# ANXIETY RESPONSES (with variety)
-# ----------------------------------------------------------------------
 def anxiety_response(age_group):
-    response_pool = {
-        "teen": [
-            {
-                "msg": "Anxiety at your age can feel so overwhelming - with school, friends, and figuring out who you are. 🦋 You're safe right now. Let's breathe together. In for 4, hold for 4, out for 4. What's making you feel anxious?",
-                "tips": ["🌬️ Breathe slowly - in through nose, out through mouth", "📱 Talk to a friend who makes you feel calm", "🎵 Listen to calming music", "🧸 Do something that comforts you"]
-            },
-            {
-                "msg": "That anxious feeling is so uncomfortable, I know. 🦋 Your brain is trying to protect you, but it's overworking right now. Let's ground ourselves. What can you see around you?",
-                "tips": ["🔍 Name 5 things you can see", "🖐️ 4 things you can touch", "👂 3 things you can hear", "🌬️ Breathe slowly"]
-            }
-        ],
-        "young_adult": [
-            {
-                "msg": "Anxiety in your 20s is so common - with career, relationships, and future uncertainty. 🦋 But you're here, you're trying, and that counts for so much. Let's ground ourselves. What's worrying you most right now?",
-                "tips": ["🔍 Name 5 things you can see, 4 you can touch, 3 you hear, 2 you smell, 1 you taste", "🌬️ Breathe slowly - your body will follow", "🌈 This feeling will pass, it always does", "💪 You've survived 100% of your hard days so far"]
-            },
-            {
-                "msg": "That knot of anxiety in your chest - I know it well. 🦋 Let's untangle it together, one breath at a time. What's at the root of this worry?",
-                "tips": ["📝 Write down your worries", "🎯 Focus on what you can control", "🌬️ Extend your exhale - it calms the nervous system", "📞 Call someone who feels safe"]
-            }
-        ],
-        "adult": [
-            {
-                "msg": "Anxiety when you're juggling work, family, and responsibilities is completely understandable. 🦋 But right now, in this moment, you're safe. Let's breathe together. What's the main source of worry for you today?",
-                "tips": ["🌬️ Take 5 deep breaths, slowly", "📝 Write down what you can and cannot control", "🏃 Move your body - even a short walk helps", "💭 Be kind to your anxious thoughts"]
-            },
-            {
-                "msg": "Adult anxiety often comes from carrying too much. 🦋 What's one responsibility you could set down, even just for today?",
-                "tips": ["🌿 Give yourself permission to rest", "📞 Talk to someone who understands", "🎯 One thing at a time", "💪 You're stronger than your anxiety"]
-            }
-        ],
-        "senior": [
-            {
-                "msg": "Anxiety can come at any age - health concerns, family worries, or just the uncertainty of life. 🦋 You've lived through so much already. You're stronger than you know. What's troubling your heart today?",
-                "tips": ["🌬️ Gentle, slow breathing", "☕ Sit quietly with a warm drink", "📞 Call someone who brings you comfort", "🌿 Remember all you've overcome"]
-            },
-            {
-                "msg": "Worry at this stage is so understandable, dear. 🦋 But you've weathered so many storms. You'll get through this too.",
-                "tips": ["📖 Read something comforting", "🌿 Spend time in nature", "👵 Reach out to loved ones", "💝 Be gentle with yourself"]
-            }
-        ]
-    }
-    
-    selected = random.choice(response_pool[age_group])
-    return {
-        'emotion': 'Anxiety',
-        'stress_score': 8,
-        'stress_level': 'High',
-        'stress_icon': '🔴',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
+    return respond('anxiety', age_group)
 
-
-# ----------------------------------------------------------------------
-# RELATIONSHIP RESPONSES (with variety)
-# ----------------------------------------------------------------------
 def relationship_response(age_group):
-    response_pool = {
-        "teen": [
-            {
-                "msg": "Relationships - whether with friends, family, or first loves - can be so hard at your age. 💝 Everything feels so intense. What happened? I'm here to listen without any judgment.",
-                "tips": ["💗 Your feelings are valid", "📝 Write down what you wish you could say", "💬 Talk to someone you trust", "🧘 Take time for yourself too"]
-            },
-            {
-                "msg": "Friendship or relationship struggles at your age can feel world-ending. 💝 They're not, but they hurt deeply. What's happening?",
-                "tips": ["💗 Give yourself space to cry if needed", "📱 Reach out to a different friend", "🎵 Music can help process feelings", "🌱 This pain will ease with time"]
-            }
-        ],
-        "young_adult": [
-            {
-                "msg": "Relationships in your 20s can be complicated - friendships changing, romantic relationships, family dynamics. 💝 It's a lot to navigate. What's happening that's hurting you?",
-                "tips": ["💗 Give yourself space to feel", "📝 Journal your thoughts", "👥 Talk to someone who supports you", "🤲 You deserve to be treated with kindness"]
-            },
-            {
-                "msg": "I hear the hurt in your words about relationships. 💝 Your 20s are when we learn so much about love and loss. What's weighing on your heart?",
-                "tips": ["💗 You are worthy of love", "📞 Reach out to a trusted friend", "🌿 Take time to heal", "💪 This pain is teaching you something"]
-            }
-        ],
-        "adult": [
-            {
-                "msg": "Relationships at this stage - marriage, partnerships, friendships - they require so much work. 💝 It's okay to struggle. What's weighing on your heart right now?",
-                "tips": ["💗 Communicate what you need", "📝 Sometimes writing helps clarify feelings", "👥 Don't isolate yourself", "🧘 Take care of yourself first"]
-            },
-            {
-                "msg": "Long-term relationships have seasons of difficulty. 💝 That doesn't mean it's broken. What's challenging you right now?",
-                "tips": ["💗 Patience with yourself and others", "📞 Consider talking to someone neutral", "🌿 Reflect on what you truly need", "💪 You've worked through hard things before"]
-            }
-        ],
-        "senior": [
-            {
-                "msg": "Relationship challenges don't get easier with age, dear. 💝 Whether it's family, children, or friends - our hearts remain tender. What's troubling you?",
-                "tips": ["💗 Your feelings matter at any age", "📞 Reach out to someone understanding", "📖 Reflect on what truly matters to you", "🌿 Peace is precious - protect yours"]
-            },
-            {
-                "msg": "At this stage of life, relationships with adult children or aging friends bring unique challenges. 💝 What's on your heart?",
-                "tips": ["💗 It's okay to set boundaries", "📞 Connection, even brief, helps", "🌿 Focus on quality over quantity", "💝 You deserve respect and kindness"]
-            }
-        ]
-    }
-    
-    selected = random.choice(response_pool[age_group])
-    return {
-        'emotion': 'Relationship Concern',
-        'stress_score': 6,
-        'stress_level': 'Medium',
-        'stress_icon': '🟡',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
+    return respond('relationship', age_group)
 
-
-# ----------------------------------------------------------------------
-# DEFAULT RESPONSES (with variety)
-# ----------------------------------------------------------------------
 def default_response(age_group):
-    response_pool = {
-        "teen": [
-            {
-                "msg": "Thank you for sharing with me. 🤍 How are you feeling right now? Sometimes just talking helps.",
-                "tips": ["🌬️ Take three deep breaths", "📱 Text a friend who makes you smile", "🎵 Listen to your favorite song", "🌟 You're doing better than you think"]
-            },
-            {
-                "msg": "I'm here for you. 🌸 Tell me more about what's on your mind - I'm listening without judgment.",
-                "tips": ["💧 Drink some water", "📝 Write down your thoughts", "🚶 Take a short walk", "💫 Your feelings matter"]
-            },
-            {
-                "msg": "Whatever you're feeling is valid. 💫 Would you like to tell me more?",
-                "tips": ["🎵 Play a song you love", "📞 Call someone who gets you", "😴 Rest if you're tired", "🌟 You're not alone"]
-            }
-        ],
-        "young_adult": [
-            {
-                "msg": "Thank you for reaching out. 🤍 How are you doing right now, in this moment?",
-                "tips": ["🌬️ Breathe deeply for a moment", "☕ Take a break with something warm", "📝 Journal your thoughts if you can", "💪 You've got this"]
-            },
-            {
-                "msg": "I'm here to listen. 🌸 Take your time and tell me what's on your mind.",
-                "tips": ["🌿 Step outside for fresh air", "📞 Call someone who lifts you up", "🎯 One thing at a time", "💫 This moment is yours"]
-            },
-            {
-                "msg": "Your feelings matter. 💫 What's been happening with you lately?",
-                "tips": ["📝 Write three things you're grateful for", "☕ Savor a warm drink", "🚶 Move your body gently", "🌟 You're exactly where you need to be"]
-            }
-        ],
-        "adult": [
-            {
-                "msg": "Thank you for taking time to talk. 🤍 How are you feeling today?",
-                "tips": ["🌬️ Take a few deep breaths", "☕ Give yourself a quiet moment", "🌿 Small breaks make a difference", "💝 Be gentle with yourself"]
-            },
-            {
-                "msg": "I appreciate you sharing. 🌸 What's been on your heart lately?",
-                "tips": ["📝 Check in with yourself", "📞 Connect with someone who matters", "🚶 A short walk can shift perspective", "💪 You're handling a lot"]
-            },
-            {
-                "msg": "Life can be so busy - I'm glad you're here. 💫 What would you like to talk about?",
-                "tips": ["🌿 Prioritize one thing today", "☕ Create a small moment of peace", "👥 You don't have to do it alone", "🌟 You're doing enough"]
-            }
-        ],
-        "senior": [
-            {
-                "msg": "Thank you for your time, dear. 🤍 How are you feeling today?",
-                "tips": ["🌬️ Breathe slowly and gently", "☕ Enjoy a quiet moment", "🌿 Peace starts within", "💝 You're exactly where you need to be"]
-            },
-            {
-                "msg": "I'm always here to listen. 🌸 What's on your mind today?",
-                "tips": ["📞 Call someone who cares", "📖 Read something comforting", "🌿 Look out the window at nature", "💫 Your presence here matters"]
-            },
-            {
-                "msg": "Your presence here means a lot. 💫 What would you like to share?",
-                "tips": ["☕ Sip something warm slowly", "📝 Write down a happy memory", "👵 Reach out to family", "🌸 Be kind to yourself today"]
-            }
-        ]
-    }
-    
-    selected = random.choice(response_pool[age_group])
-    return {
-        'emotion': 'Gentle Conversation',
-        'stress_score': 2,
-        'stress_level': 'Low',
-        'stress_icon': '🟢',
-        'caring_response': selected["msg"],
-        'tips': selected["tips"]
-    }
\ No newline at end of file
+    return respond('default', age_group)
+
+
+# ======================================================================
+# TIP POPULARITY - how often each tip was saved as a favorite
+# ======================================================================
+
+# popular  - most saved tips first
+# weighted - random order, each tip weighted by 1 + its saves
+TIP_RANKINGS = ('popular', 'weighted')
+
+# (emotion, age_group) -> {tip: saves}; replaced wholesale by set_tip_popularity
+_tip_popularity = {}
+_popularity_lock = threading.Lock()
+
+
+def set_tip_popularity(counts):
+    """Replace the popularity snapshot with ``{(emotion, age_group, tip): saves}``"""
+    global _tip_popularity
+    grouped = {}
+    for (emotion, age_group, tip), saves in counts.items():
+        if saves > 0:
+            grouped.setdefault((emotion, age_group), {})[tip] = saves
+    _tip_popularity = grouped
+
+
+def adjust_tip_popularity(emotion, age_group, tip, delta):
+    """Add ``delta`` saves to one tip, as a favorite is saved (+1) or deleted (-1)"""
+    with _popularity_lock:
+        counts = _tip_popularity.setdefault((emotion, age_group), {})
+        saves = counts.get(tip, 0) + delta
+        if saves > 0:
+            counts[tip] = saves
+        else:
+            counts.pop(tip, None)
+
+
+def rank_tips(result, age_group, ranking='popular'):
+    """Order ``result``'s tips by their popularity for its emotion and ``age_group``.
+
+    One dict lookup per tip; results nobody has saved tips for come back
+    unchanged.
+    """
+    if ranking not in TIP_RANKINGS:
+        raise ValueError(f"Unknown tip ranking {ranking!r}, expected one of {TIP_RANKINGS}")
+    counts = _tip_popularity.get((result.emotion, age_group))
+    if not counts or len(result.tips) < 2:
+        return result
+    if ranking == 'popular':
+        tips = sorted(result.tips, key=lambda tip: -counts.get(tip, 0))
+    else:
+        remaining = list(result.tips)
+        weights = [1 + counts.get(tip, 0) for tip in remaining]
+        tips = []
+        while remaining:
+            index = random.choices(range(len(remaining)), weights)[0]
+            tips.append(remaining.pop(index))
+            weights.pop(index)
+    if tuple(tips) == result.tips:
+        return result
+    return result.with_tips(tips)
+
+
+# ======================================================================
+# TIP SEARCH
+# ======================================================================
+
+TIP_SEARCH_CACHE_SIZE = int(os.environ.get('SERENITY_TIP_SEARCH_CACHE_SIZE', 1024))
+
+
+@lru_cache(maxsize=TIP_SEARCH_CACHE_SIZE)
+def _search_tip_ids(lexicon, terms, emotion, age_group):
+    return lexicon.tip_index.search(terms, emotion, age_group)
+
+
+def search_tips(query='', emotion=None, age_group=None, page=1, per_page=20):
+    """Search every coping tip by words, emotion and age group.
+
+    Every query word must appear in a tip (after normalization). Matching
+    ids are cached per query, so paging through results reuses them.
+    Returns ``(total, tips)`` where ``tips`` is the requested page of
+    ``Tip(text, emotion, age_groups)`` tuples.
+    """
+    lexicon = _active
+    ids = _search_tip_ids(lexicon, search_terms(query or ''), emotion or None, age_group or None)
+    start = (page - 1) * per_page
+    return len(ids), [lexicon.tip_index.tips[doc_id] for doc_id in ids[start:start + per_page]]
+
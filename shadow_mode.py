@@ -0,0 +1,93 @@
+import logging
+import queue
+import random
+import time
+
+from background_worker import LazyThread
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowEvaluator:
+    """Runs a candidate detector on a sample of live requests, off the response path.
+
+    ``submit`` is called after the primary result is known. A ``rate``
+    fraction of calls is queued for a single background thread, which runs
+    ``candidate(message, age, context=context)``, times it and hands batches
+    of comparison records to ``record(records)``. When the queue is full the
+    sample is dropped, so shadow work never holds up a request.
+    """
+
+    def __init__(self, candidate, record, rate=0.0, queue_size=256, batch_size=50):
+        self.candidate = candidate
+        self.record = record
+        self.rate = rate
+        self.batch_size = batch_size
+        self.submitted = 0
+        self.dropped = 0
+        self.compared = 0
+        self.disagreements = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker = LazyThread(self._run, 'shadow-detector')
+
+    def submit(self, message, age, context, primary, primary_latency_ms):
+        """Maybe queue a comparison against ``primary``; returns True when queued"""
+        if self.rate <= 0 or random.random() >= self.rate:
+            return False
+        self._worker.start()
+        try:
+            self._queue.put_nowait((message, age, context, primary, primary_latency_ms))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _compare(self, message, age, context, primary, primary_latency_ms):
+        started = time.perf_counter()
+        candidate = self.candidate(message, age, context=context)
+        candidate_latency_ms = (time.perf_counter() - started) * 1000
+        agreed = candidate.emotion == primary.emotion
+        self.compared += 1
+        if not agreed:
+            self.disagreements += 1
+        return {
+            'message': message,
+            'primary_emotion': primary.emotion,
+            'candidate_emotion': candidate.emotion,
+            'primary_stress': primary.stress_score,
+            'candidate_stress': candidate.stress_score,
+            'agreed': agreed,
+            'primary_latency_ms': primary_latency_ms,
+            'candidate_latency_ms': candidate_latency_ms,
+        }
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = []
+            for item in items:
+                try:
+                    records.append(self._compare(*item))
+                except Exception as e:
+                    logger.error(f"Shadow detection failed: {e}")
+            if records:
+                try:
+                    self.record(records)
+                except Exception as e:
+                    logger.error(f"Saving shadow results failed: {e}")
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'compared': self.compared,
+            'disagreements': self.disagreements,
+            'queued': self._queue.qsize(),
+        }
@@ -0,0 +1,59 @@
+import math
+
+# ======================================================================
+# ONLINE STRESS TREND - O(1) update per message
+# ======================================================================
+# Each user's trend is an exponentially weighted mean and variance of their
+# stress scores plus a two-sided CUSUM over the standardized surprise of
+# every new score. When either CUSUM side passes its threshold the trend is
+# flagged as rising or falling and the sums start over.
+
+# Weight of the newest score in the moving average (~ the last 10 messages)
+ALPHA = 0.2
+# Surprise below this many standard deviations is treated as noise
+CUSUM_SLACK = 0.5
+# Accumulated surprise that marks a change in stress
+CUSUM_THRESHOLD = 4.0
+# Floor for the standard deviation, so a run of identical scores doesn't
+# make the next small change look enormous
+MIN_STD = 1.0
+
+RISING = 'rising'
+FALLING = 'falling'
+
+
+def update_trend(trend, score, now):
+    """Fold ``score`` into ``trend`` in place.
+
+    ``trend`` is any object with ``count``, ``ewma``, ``variance``,
+    ``cusum_up``, ``cusum_down``, ``direction``, ``changed_at``,
+    ``last_score`` and ``updated_at`` attributes, such as a StressTrend row.
+    Returns the direction when this score completed a change, else ``None``.
+    """
+    trend.last_score = score
+    trend.updated_at = now
+    if not trend.count:
+        trend.count = 1
+        trend.ewma = float(score)
+        trend.variance = 0.0
+        trend.cusum_up = trend.cusum_down = 0.0
+        return None
+
+    deviation = score - trend.ewma
+    surprise = deviation / max(math.sqrt(trend.variance), MIN_STD)
+    trend.count += 1
+    trend.ewma += ALPHA * deviation
+    trend.variance = (1 - ALPHA) * (trend.variance + ALPHA * deviation * deviation)
+
+    trend.cusum_up = max(0.0, trend.cusum_up + surprise - CUSUM_SLACK)
+    trend.cusum_down = max(0.0, trend.cusum_down - surprise - CUSUM_SLACK)
+    changed = None
+    if trend.cusum_up > CUSUM_THRESHOLD:
+        changed = RISING
+    elif trend.cusum_down > CUSUM_THRESHOLD:
+        changed = FALLING
+    if changed:
+        trend.direction = changed
+        trend.changed_at = now
+        trend.cusum_up = trend.cusum_down = 0.0
+    return changed
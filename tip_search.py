@@ -0,0 +1,87 @@
+import re
+from collections import namedtuple
+
+# ======================================================================
+# TIP SEARCH - inverted index over every coping tip in the response pools
+# ======================================================================
+
+_TERM_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+_APOSTROPHES = str.maketrans({'‘': "'", '’': "'", 'ʼ': "'", '＇': "'"})
+
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'its',
+    'of', 'on', 'or', 'that', 'the', 'to', 'with', 'you', 'your', "you're", 'yourself',
+))
+
+Tip = namedtuple('Tip', ['text', 'emotion', 'age_groups'])
+
+
+def normalize_term(word):
+    """Casefold ``word`` and strip common suffixes, so "breathing" finds "breathe" and "breaths" """
+    word = word.casefold().translate(_APOSTROPHES)
+    for suffix in ('ing', 'ed', 'es', 's', 'e'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith('ss'):
+            return word[:-len(suffix)]
+    return word
+
+
+def search_terms(text):
+    """Normalized, de-duplicated search terms of ``text``, stop words removed"""
+    terms = []
+    for word in _TERM_RE.findall(text.casefold().translate(_APOSTROPHES)):
+        if word not in STOP_WORDS:
+            term = normalize_term(word)
+            if term not in terms:
+                terms.append(term)
+    return tuple(terms)
+
+
+class TipIndex:
+    """Immutable inverted index from terms, emotions and age groups to tips.
+
+    Built once per lexicon from ``(tip, emotion, age_group)`` triples. Each
+    distinct (tip, emotion) pair becomes one document; every posting list is
+    a sorted tuple of document ids, so queries only intersect the lists
+    they name.
+    """
+
+    def __init__(self, entries):
+        documents = {}
+        for text, emotion, age_group in entries:
+            documents.setdefault((text, emotion), []).append(age_group)
+        self.tips = tuple(
+            Tip(text, emotion, tuple(dict.fromkeys(age_groups)))
+            for (text, emotion), age_groups in sorted(documents.items(), key=lambda item: (item[0][1], item[0][0]))
+        )
+
+        by_term = {}
+        by_emotion = {}
+        by_age_group = {}
+        for doc_id, tip in enumerate(self.tips):
+            for term in search_terms(tip.text):
+                by_term.setdefault(term, []).append(doc_id)
+            by_emotion.setdefault(tip.emotion.casefold(), []).append(doc_id)
+            for age_group in tip.age_groups:
+                by_age_group.setdefault(age_group, []).append(doc_id)
+        self.by_term = {term: tuple(ids) for term, ids in by_term.items()}
+        self.by_emotion = {emotion: tuple(ids) for emotion, ids in by_emotion.items()}
+        self.by_age_group = {age_group: tuple(ids) for age_group, ids in by_age_group.items()}
+        self.emotions = tuple(sorted({tip.emotion for tip in self.tips}))
+
+    def search(self, terms=(), emotion=None, age_group=None):
+        """Return the ids of tips containing every term and matching the filters, in index order"""
+        postings = [self.by_term.get(term, ()) for term in terms]
+        if emotion:
+            postings.append(self.by_emotion.get(emotion.casefold(), ()))
+        if age_group:
+            postings.append(self.by_age_group.get(age_group, ()))
+        if not postings:
+            return tuple(range(len(self.tips)))
+        # Intersect starting from the shortest list
+        postings.sort(key=len)
+        matches = set(postings[0])
+        for ids in postings[1:]:
+            if not matches:
+                break
+            matches.intersection_update(ids)
+        return tuple(sorted(matches))